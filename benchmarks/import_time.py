@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+"""import_time: measures startup cost of emitcalc, its dependencies, and the
+emitcalc script, each in a fresh interpreter; the script is timed both for
+'--help' and for small single-fuelbed runs, each of which loads only the EF
+model it uses
+
+Example calls:
+ > ./benchmarks/import_time.py
+ > ./benchmarks/import_time.py -n 20
+"""
+
+__author__      = "Joel Dubowy"
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO_ROOT, 'bin', 'emitcalc')
+INPUT_FILE = os.path.join(REPO_ROOT, 'test', 'data',
+    'truncated-consume-output.json')
+
+CASES = [
+    ('python (baseline)', [sys.executable, '-c', 'pass']),
+    ('import emitcalc', [sys.executable, '-c', 'import emitcalc']),
+    ('import emitcalc.calculator', [sys.executable, '-c', 'import emitcalc.calculator']),
+    ('import numpy', [sys.executable, '-c', 'import numpy']),
+    ('import afscripting', [sys.executable, '-c', 'import afscripting']),
+    ('import eflookup.fccs2ef', [sys.executable, '-c', 'import eflookup.fccs2ef']),
+    ('import eflookup.fepsef', [sys.executable, '-c', 'import eflookup.fepsef']),
+    ('emitcalc --help', [sys.executable, SCRIPT, '--help']),
+    ('emitcalc -f 52', [sys.executable, SCRIPT, '-f', '52',
+        '-i', INPUT_FILE]),
+    ('emitcalc --scenario feps', [sys.executable, SCRIPT, '--scenario', 'feps',
+        '-i', INPUT_FILE])
+]
+
+def _time(cmd, n):
+    env = dict(os.environ,
+        PYTHONPATH=os.pathsep.join([REPO_ROOT, os.environ.get('PYTHONPATH', '')]))
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        r = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+        if r.returncode != 0:
+            return None
+    return statistics.median(times)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--num-runs', type=int, default=10,
+        help="Number of runs per case; the median is reported")
+    args = parser.parse_args()
+
+    for name, cmd in CASES:
+        t = _time(cmd, args.num_runs)
+        print('{:<30} {}'.format(name,
+            'failed' if t is None else '{:8.1f} ms'.format(t * 1000)))
@@ -0,0 +1,197 @@
+__author__      = "Joel Dubowy"
+
+import glob
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from . import codec
+from .calculator import EmissionsCalculator
+
+__all__ = [
+    'BatchRunner',
+    'find_input_files'
+]
+
+def find_input_files(dir_or_glob):
+    """Returns sorted list of input files - either all '.json' files in
+    the given directory or all files matching the given glob pattern
+    """
+    if os.path.isdir(dir_or_glob):
+        dir_or_glob = os.path.join(dir_or_glob, '*.json')
+    return sorted(f for f in glob.glob(dir_or_glob) if os.path.isfile(f))
+
+class BatchRunner(object):
+
+    # Top level key in an input file that may specify the file's EF model
+    EF_MODEL_KEY = 'ef_model'
+
+    DEFAULT_NUM_WORKERS = 4
+
+    def __init__(self, lookup_factory, **options):
+        """BatchRunner constructor
+
+        Args:
+         - lookup_factory -- function that takes an EF model specification
+           (e.g. 'fccs:52:rx') and returns the ef look-up object(s) to pass
+           to EmissionsCalculator
+
+        Options:
+         - silent_fail, species -- see EmissionsCalculator
+         - manifest -- dict mapping input file, by basename or by path, to
+           EF model specification; paths are compared after normalization,
+           so that, e.g., './in/a.json', 'in/a.json', and the equivalent
+           absolute path all match the same file
+         - manifest_dir -- directory to which relative paths in the manifest
+           are relative (e.g. the manifest file's directory); defaults to
+           the current working directory
+         - default_ef_model -- EF model specification used for files not
+           in the manifest and not specifying their own EF model
+         - num_workers -- size of the pool of threads that read and write
+           files; also bounds the number of files read ahead of, or waiting
+           to be written after, computation; defaults to 4
+         - indent -- indentation used when dumping json output
+         - output_efs -- whether or not to write the emissions factors, as a
+           second JSON document, after the emissions
+         - result_cache -- emitcalc.cache.ResultCache shared by all
+           calculators, with each file's EF model used as look-up key
+
+        Notes:
+         - The EF model for each file is taken, in order of precedence, from
+           the manifest, from the file's top level 'ef_model' key, or from
+           default_ef_model
+         - One calculator is created per EF model and reused, along with
+           its EF cache, across all files using that model. Calculations are
+           run in the calling thread; only I/O and JSON (de)serialization
+           happen in the worker pool
+         - Files are read and written with emitcalc.codec, so that
+           consumption and emissions values are passed to and from the
+           calculators as numpy arrays
+        """
+        self._lookup_factory = lookup_factory
+        self._calculator_options = {
+            'silent_fail': options.get('silent_fail'),
+            'species': options.get('species') or [],
+            'output_arrays': True,
+            'result_cache': options.get('result_cache')
+        }
+        manifest = options.get('manifest') or {}
+        manifest_dir = options.get('manifest_dir') or os.getcwd()
+        self._manifest_by_path = {
+            os.path.normpath(os.path.join(manifest_dir, f)): ef_model
+                for f, ef_model in manifest.items()
+        }
+        self._manifest_by_basename = {
+            f: ef_model for f, ef_model in manifest.items()
+                if os.path.basename(f) == f
+        }
+        self._default_ef_model = options.get('default_ef_model')
+        self._num_workers = options.get('num_workers') or self.DEFAULT_NUM_WORKERS
+        self._indent = options.get('indent')
+        self._output_efs = options.get('output_efs')
+        self._calculators = {}
+
+    ##
+    ## Public Interface
+    ##
+
+    def run(self, input_files, output_dir):
+        """Computes emissions for each input file, writing each file's output
+        to output_dir, at the file's path relative to the input files' common
+        directory; e.g. for input files a/x.json and b/x.json, outputs are
+        written to <output_dir>/a/x.json and <output_dir>/b/x.json
+
+        Returns dict mapping each input file that failed to its error
+        message; failures don't stop processing of the remaining files.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        failures = {}
+        input_files = list(input_files)
+        output_files = self._output_files(input_files, output_dir)
+        input_files = iter(input_files)
+        with ThreadPoolExecutor(self._num_workers) as pool:
+            reads = deque()
+            writes = deque()
+
+            def _read_ahead():
+                while len(reads) < self._num_workers:
+                    input_file = next(input_files, None)
+                    if input_file is None:
+                        break
+                    reads.append((input_file, pool.submit(self._read, input_file)))
+
+            _read_ahead()
+            while reads:
+                input_file, read = reads.popleft()
+                _read_ahead()
+                try:
+                    output = self._compute(*read.result())
+                except Exception as e:
+                    self._fail(failures, input_file, e)
+                    continue
+
+                writes.append((input_file, pool.submit(self._write,
+                    output_files[input_file], output)))
+                while len(writes) > self._num_workers:
+                    self._finish_write(failures, *writes.popleft())
+
+            while writes:
+                self._finish_write(failures, *writes.popleft())
+
+        return failures
+
+    ##
+    ## Helpers
+    ##
+
+    def _output_files(self, input_files, output_dir):
+        if not input_files:
+            return {}
+        input_files_abs = [os.path.abspath(f) for f in input_files]
+        root = os.path.commonpath([os.path.dirname(f) for f in input_files_abs])
+        return {
+            f: os.path.join(output_dir, os.path.relpath(f_abs, root))
+                for f, f_abs in zip(input_files, input_files_abs)
+        }
+
+    def _read(self, input_file):
+        with open(input_file) as f:
+            data = codec.load(f)
+        ef_model = None
+        if hasattr(data, 'pop'):
+            ef_model = data.pop(self.EF_MODEL_KEY, None)
+        ef_model = (self._manifest_by_path.get(os.path.abspath(input_file))
+            or self._manifest_by_basename.get(os.path.basename(input_file))
+            or ef_model or self._default_ef_model)
+        if not ef_model:
+            raise ValueError("No EF model specified")
+        return ef_model, data
+
+    def _compute(self, ef_model, data):
+        calculator = self._calculators.get(ef_model)
+        if calculator is None:
+            calculator = EmissionsCalculator(self._lookup_factory(ef_model),
+                lookup_key=ef_model, **self._calculator_options)
+            self._calculators[ef_model] = calculator
+        emissions = calculator.calculate(data)
+        return (emissions,
+            calculator.emissions_factors if self._output_efs else None)
+
+    def _write(self, output_file, output):
+        emissions, emissions_factors = output
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        with open(output_file, 'w') as f:
+            f.write(codec.dumps(emissions, indent=self._indent))
+            if emissions_factors is not None:
+                f.write('\n' + codec.dumps(emissions_factors, indent=self._indent))
+
+    def _finish_write(self, failures, input_file, write):
+        try:
+            write.result()
+        except Exception as e:
+            self._fail(failures, input_file, e)
+
+    def _fail(self, failures, input_file, e):
+        logging.error('Failed to process %s: %s', input_file, e)
+        failures[input_file] = str(e)
@@ -0,0 +1,238 @@
+__author__      = "Joel Dubowy"
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+__all__ = [
+    'ResultCache'
+]
+
+class ResultCache(object):
+
+    DEFAULT_MAX_ENTRIES = 128
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+    # Temp files older than this, in seconds, are assumed to have been left
+    # behind by killed processes, and are removed
+    STALE_TEMP_FILE_AGE = 3600
+
+    def __init__(self, **options):
+        """ResultCache constructor
+
+        Options:
+         - max_entries -- max number of results kept in memory, least
+           recently used being evicted first; defaults to 128
+         - max_bytes -- max estimated size, in bytes, of the results kept in
+           memory, least recently used being evicted first, and results
+           larger than it not being kept in memory at all; sizes are
+           estimated from arrays' nbytes and from the number of values in
+           lists; defaults to 256 MB
+         - cache_dir -- if specified, results are also stored on disk, in
+           this directory, so that they can be reused across processes;
+           values must be nested dicts and lists of JSON serializable
+           values and numpy arrays, which are stored in .npz files without
+           pickling (tuples are loaded as lists, and arrays as read-only)
+         - max_dir_bytes -- max total size, in bytes, of the files in
+           cache_dir, least recently used files being removed first once
+           it's exceeded; if not specified, cache_dir grows without limit
+
+        Notes:
+         - a cache may be shared by multiple calculators, since keys
+           include each calculator's look-up key (see EmissionsCalculator)
+         - values are stored and returned as is; EmissionsCalculator copies
+           results before caching them and when returning cached results
+         - temp files, left in cache_dir by processes killed while writing
+           results, are removed once they're an hour old
+        """
+        self._max_entries = options.get('max_entries') or self.DEFAULT_MAX_ENTRIES
+        self._max_bytes = options.get('max_bytes') or self.DEFAULT_MAX_BYTES
+        self._cache_dir = options.get('cache_dir')
+        self._max_dir_bytes = options.get('max_dir_bytes')
+        self._dir_bytes = None
+        if self._cache_dir:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            self._prune_dir()
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._num_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def num_bytes(self):
+        """Estimated size of the results kept in memory"""
+        return self._num_bytes
+
+    ##
+    ## Public Interface
+    ##
+
+    def get(self, key):
+        """Returns cached value, or None if not cached"""
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                self._entries[key] = value
+                return value
+
+        value = self._load(key)
+        if value is not None:
+            self._add(key, value)
+        return value
+
+    def set(self, key, value):
+        self._add(key, value)
+        self._dump(key, value)
+
+    ##
+    ## Helpers
+    ##
+
+    def _add(self, key, value):
+        size = _estimate_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self._max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._num_bytes += size
+            while (len(self._entries) > self._max_entries
+                    or self._num_bytes > self._max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        if self._entries.pop(key, None) is not None:
+            self._num_bytes -= self._sizes.pop(key)
+
+    def _file_name(self, key):
+        return os.path.join(self._cache_dir, key + '.npz')
+
+    # Each file stores the value's numpy arrays, plus a JSON 'skeleton' of
+    # the rest of the value, with each array replaced by a reference to it
+
+    SKELETON = 'skeleton'
+    ARRAY_REF = '__array__'
+    TEMP_FILE_PREFIX = '.tmp-'
+
+    def _load(self, key):
+        if not self._cache_dir:
+            return None
+        try:
+            file_name = self._file_name(key)
+            with numpy.load(file_name, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            # mark as recently used (see _prune_dir)
+            os.utime(file_name)
+            skeleton = json.loads(str(arrays.pop(self.SKELETON)))
+            return self._unflatten(skeleton, arrays)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning('Failed to load cached result %s: %s', key, e)
+            return None
+
+    def _dump(self, key, value):
+        if not self._cache_dir:
+            return
+        # write to temp file and then rename, so that readers in other
+        # processes never see partially written files
+        fd, tmp_file_name = tempfile.mkstemp(dir=self._cache_dir,
+            prefix=self.TEMP_FILE_PREFIX)
+        try:
+            arrays = {}
+            skeleton = json.dumps(self._flatten(value, arrays))
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, **{self.SKELETON: numpy.array(skeleton)},
+                    **arrays)
+            size = os.path.getsize(tmp_file_name)
+            os.replace(tmp_file_name, self._file_name(key))
+        except Exception as e:
+            logging.warning('Failed to store cached result %s: %s', key, e)
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+            return
+
+        if self._max_dir_bytes:
+            with self._lock:
+                self._dir_bytes += size
+                if self._dir_bytes > self._max_dir_bytes:
+                    self._prune_dir()
+
+    def _prune_dir(self):
+        """Removes stale temp files and, if max_dir_bytes is set, least
+        recently used files until the directory is within it. Sets
+        self._dir_bytes, which is then updated as files are written; since
+        other processes may write to the same directory, it's only an
+        estimate between calls.
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self._cache_dir):
+            try:
+                stat = entry.stat()
+                if entry.name.startswith(self.TEMP_FILE_PREFIX):
+                    if now - stat.st_mtime > self.STALE_TEMP_FILE_AGE:
+                        os.remove(entry.path)
+                elif entry.name.endswith('.npz'):
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                # removed by another process
+                pass
+
+        self._dir_bytes = sum(f[1] for f in files)
+        if self._max_dir_bytes:
+            for mtime, size, path in sorted(files):
+                if self._dir_bytes <= self._max_dir_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                self._dir_bytes -= size
+
+    def _flatten(self, obj, arrays):
+        if isinstance(obj, dict):
+            return {k: self._flatten(v, arrays) for k, v in obj.items()}
+        elif isinstance(obj, (list, tuple)):
+            return [self._flatten(v, arrays) for v in obj]
+        elif isinstance(obj, numpy.ndarray):
+            name = 'a{}'.format(len(arrays))
+            arrays[name] = obj
+            return {self.ARRAY_REF: name}
+        elif isinstance(obj, numpy.generic):
+            return obj.item()
+        return obj
+
+    def _unflatten(self, obj, arrays):
+        if isinstance(obj, dict):
+            if self.ARRAY_REF in obj:
+                a = arrays[obj[self.ARRAY_REF]]
+                a.flags.writeable = False
+                return a
+            return {k: self._unflatten(v, arrays) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [self._unflatten(v, arrays) for v in obj]
+        return obj
+
+def _estimate_size(obj):
+    """Returns rough estimate of the memory used by a result, in bytes"""
+    if isinstance(obj, dict):
+        return 64 + sum(64 + _estimate_size(v) for v in obj.values())
+    elif isinstance(obj, (list, tuple)):
+        # pointer plus python float per value
+        return 56 + sum(8 + _estimate_size(v) for v in obj)
+    elif isinstance(obj, numpy.ndarray):
+        # Note: views of arrays shared by multiple results are counted once
+        # per result
+        return 112 + obj.nbytes
+    return 24
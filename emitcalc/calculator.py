@@ -1,8 +1,15 @@
 __author__      = "Joel Dubowy"
 
+import hashlib
+import importlib.metadata
 import logging
-from collections import defaultdict
-from functools import reduce
+import uuid
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import lru_cache, reduce
+
+import numpy
+
+from . import __version__
 
 __all__ = [
     'EmissionsCalculator'
@@ -11,6 +18,115 @@ __all__ = [
 class InvalidConsumptionDataError(ValueError):
     pass
 
+# keys - list of (category, sub-category) tuples, one per row of 'consumption'
+# category_slices - rows of 'consumption' belonging to each category
+# consumption - array of shape (# sub-categories, # phases, # fuelbeds)
+# present - boolean array, of shape (# sub-categories, # phases), indicating
+#   which phases were defined in the consumption data
+ConsumptionIndex = namedtuple('ConsumptionIndex', ['keys', 'category_slices',
+    'consumption', 'present', 'num_fuelbeds'])
+
+def _copy_result(obj, freeze=False):
+    """Copies the nested dicts and lists of emissions or emissions factors.
+    numpy arrays are copied and made read-only only if freeze is set, and
+    otherwise are assumed to already be read-only and are shared.
+    """
+    if isinstance(obj, dict):
+        return {k: _copy_result(v, freeze) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return list(obj)
+    elif isinstance(obj, numpy.ndarray) and freeze:
+        obj = obj.copy()
+        obj.flags.writeable = False
+    return obj
+
+@lru_cache(maxsize=None)
+def _eflookup_version():
+    """Returns the installed eflookup version, or None if it can't be
+    determined. Resolved on demand, rather than by importing eflookup, since
+    look-up objects needn't come from eflookup and since it's only needed
+    for result cache keys
+    """
+    try:
+        return importlib.metadata.version('eflookup')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+##
+## Output
+##
+
+# Note: the following functions convert emissions and EF arrays into the
+# calculator's nested output dicts; they're module level so that they can be
+# used without a calculator (e.g. by emitcalc.sharedmem.SharedEmissions)
+
+# species - ordering of the species axis of the arrays being converted
+# species_idx - index of each species in 'species'
+# species_by_phase - dict mapping each phase to the species to output
+# output_arrays - whether to output per-fuelbed values as numpy arrays rather
+#   than lists (see EmissionsCalculator)
+OutputSpec = namedtuple('OutputSpec', ['species', 'species_idx',
+    'species_by_phase', 'output_arrays'])
+
+def _output_spec(species, species_by_phase, output_arrays=False):
+    return OutputSpec(species, {s: j for j, s in enumerate(species)},
+        species_by_phase, bool(output_arrays))
+
+def _tensor_to_dict(keys, category_slices, tensor, output):
+    """Converts an array of shape (# sub-categories, # phases, # species,
+    # fuelbeds) into a dict of category, sub-category, phase, and species
+    """
+    d = {}
+    for category, sl in list(category_slices.items()):
+        d[category] = {
+            keys[k][1]: _phase_dict(tensor[k], output)
+                for k in range(sl.start, sl.stop)
+        }
+    return d
+
+def _summary_to_dict(category_slices, sums, output, totals=None):
+    """Converts an array of shape (# categories + 1, # phases, # species,
+    # fuelbeds), where the last row is the total over all categories, into
+    the 'summary' output dict; see _phase_dict regarding 'totals'
+    """
+    summary = {
+        'total': _phase_dict(sums[-1], output, include_total=True,
+            totals=totals)
+    }
+    for j, category in enumerate(category_slices):
+        summary[category] = _phase_dict(sums[j], output)
+    return summary
+
+def _phase_dict(tensor, output, include_total=False, totals=None):
+    """Converts an array of shape (# phases, # species, # fuelbeds) into
+    each combustion phase's species-specific emissions lists. Every phase's
+    lists are the same length, even if the ef-lookup object has different
+    sets of chemical species for the various fuelbeds, since species not
+    defined for a fuelbed are left as 0.0's. If the fuelbed axis is
+    omitted, as for the collapsed fire-level summary, scalar values are
+    produced instead of lists.
+
+    If include_total is set, the 'total' entry is taken from 'totals', an
+    array of shape (# species, # fuelbeds), if specified, and otherwise
+    is computed by summing 'tensor' over phases.
+    """
+    d = {
+        k: {s: _values(tensor[p, output.species_idx[s]], output)
+            for s in output.species_by_phase[k]}
+                for p, k in enumerate(EmissionsCalculator.PHASES)
+    }
+    if include_total:
+        if totals is None:
+            totals = tensor.sum(axis=0)
+        d['total'] = {s: _values(totals[j], output)
+            for j, s in enumerate(output.species)}
+    return d
+
+def _values(a, output):
+    if output.output_arrays and a.ndim:
+        return a
+    return a.tolist()
+
 class EmissionsCalculator(object):
 
     def __init__(self, ef_lookup_objects, **options):
@@ -24,6 +140,20 @@ class EmissionsCalculator(object):
          - silent_fail - if any emissions calculations fails, or if subset of
            data is invalid, simply skip a exclude related emissions from output
          - species - whitelist of species to compute emissions for
+         - output_arrays - if True, per-fuelbed emissions and emissions
+           factors are output as (possibly read-only) numpy arrays rather
+           than lists, avoiding the creation of a python float per value
+           (see emitcalc.codec for encoding them in bulk)
+         - result_cache - emitcalc.cache.ResultCache in which to cache
+           results, keyed by a hash of the validated consumption values,
+           weights, species, look-up key, and emitcalc and eflookup
+           versions; results returned from the cache are copies, except
+           that, with output_arrays, their arrays are read-only and shared
+         - lookup_key - string identifying the look-up objects' emissions
+           factors (e.g. 'fccs:52:rx'), used in result cache keys; specify
+           it to reuse results across calculators or, with an on-disk
+           cache, across processes. Defaults to a key unique to this
+           calculator
 
         Notes:
          - each look-up object must support the following interface:
@@ -37,34 +167,63 @@ class EmissionsCalculator(object):
            each call to calcualte, since the number of fuelbeds in the
            consumption data can vary from call to call (though, only in the
            case where a single lookup object is used for all fuelbeds)
+         - EF arrays are cached, keyed by the structure of the consumption
+           data (sub-categories, phases present, and number of fuelbeds), so
+           that look-ups aren't repeated when the calculator is reused for
+           similarly structured consume output; look-up objects are
+           therefore assumed not to change once passed to the calculator
         """
         self._species_whitelist = set(options.get('species', []))
         self._silent_fail = options.get('silent_fail')
+        self._output_arrays = options.get('output_arrays')
+        self._result_cache = options.get('result_cache')
+        self._lookup_key = options.get('lookup_key') or uuid.uuid4().hex
         self._ef_lookup_objects = ef_lookup_objects
         if not hasattr(self._ef_lookup_objects, 'species'):
             self._num_ef_look_up_objects = len(self._ef_lookup_objects)
         else:
             self._num_ef_look_up_objects = None
         self._set_output_species()
+        self._ef_tensor_cache = OrderedDict()
 
     ERROR_MESSAGES = {
         "INVALID_INPUT_TOP_LEVEL": "Invalid consumption data",
         "INVALID_INPUT_CATEGORY": "Invalid consumption data category - %s",
         "INVALID_INPUT_SUB_CATEGORY": "Invalid consumption data sub-category - %s > %s",
         'INVALID_INPUT_DATA_LENGTH_MISMATCH': "Number of combustion values "
-            "doesn't match number of fuelbeds / cover types - %s > %s > %s "
+            "doesn't match number of fuelbeds / cover types - %s > %s > %s ",
+        'INVALID_INPUT_DATA_VALUES': "Combustion values must be finite "
+            "numbers - %s > %s > %s",
+        'INVALID_WEIGHTS': "Number of weights doesn't match number of "
+            "fuelbeds / cover types",
+        'INVALID_WEIGHT_VALUES': "Weights must be finite, non-negative numbers",
+        'INVALID_AREA': "Area must be a finite, non-negative number"
     }
 
     ##
     ## Public Interface
     ##
 
-    def calculate(self, consumption_dict):
+    def calculate(self, consumption_dict, weights=None, area=None):
         """Calculates emissions given consume output
 
         Arguments
          - consumption_dict -- dictionary of consume output  (see note below)
 
+        Kwargs
+         - weights -- optional per-fuelbed weights, e.g. each fuelbed's
+           fraction of the fire's area; if specified, all per-fuelbed
+           emissions are multiplied by their fuelbed's weight, and a
+           fire-level summary, collapsed across fuelbeds, is included in
+           the output under 'fire' (see note below)
+         - area -- optional total area, by which all weights are multiplied
+           (e.g. to convert per-acre emissions for area fractions to total
+           emissions); if specified without weights, every fuelbed is
+           weighted by area, and the 'fire' summary is included
+
+        Weights and area must be finite and non-negative; otherwise,
+        ValueError is raised, regardless of silent_fail.
+
         Note: consumption_dict is expected to be of the following form:
 
             {
@@ -151,73 +310,201 @@ class EmissionsCalculator(object):
                 "residual": [0.0]
                 /* possibly other keys, which are ignored */
             }
+
+        Note: If weights or area are specified, the output's 'fire' section
+        is of the same form as its 'summary' section, but with each array of
+        per-fuelbed values replaced by their sum.
+        """
+        index, weights = self._validate_and_index(consumption_dict, weights, area)
+
+        if self._result_cache is not None:
+            cache_key = self._result_cache_key(index, weights)
+            cached = self._result_cache.get(cache_key)
+            if cached is not None:
+                emissions, self.emissions_factors = [_copy_result(r)
+                    for r in cached]
+                return emissions
+
+        ef_tensor = self._ef_tensor(index)
+        emissions_tensor = index.consumption[:, :, numpy.newaxis, :] * ef_tensor
+        emissions = self._assemble(index, emissions_tensor, ef_tensor, weights)
+
+        if self._result_cache is not None:
+            self._result_cache.set(cache_key, tuple(
+                _copy_result(r, freeze=True)
+                    for r in (emissions, self.emissions_factors)))
+
+        return emissions
+
+    ##
+    ## Result Caching
+    ##
+
+    # Note: results are copied both when cached and when returned from the
+    # cache, so that callers modifying results affect neither the cache nor
+    # other callers' results (see _copy_result)
+
+    def _result_cache_key(self, index, weights):
+        h = hashlib.blake2b(digest_size=20)
+        # package versions are included so that results cached on disk
+        # aren't reused after upgrades that change EFs or computations
+        h.update(repr((__version__, _eflookup_version(),
+            self._lookup_key, self._species,
+            bool(self._output_arrays), weights is not None, index.keys,
+            index.consumption.shape)).encode())
+        h.update(index.present)
+        h.update(index.consumption)
+        if weights is not None:
+            h.update(numpy.ascontiguousarray(weights))
+        return h.hexdigest()
+
+    ##
+    ## Consumption Indexing
+    ##
+
+    def _validate_and_index(self, consumption_dict, weights=None, area=None):
+        """Prunes and validates the consumption data and indexes it (see
+        _index_consumption); used by calculate and by the calculators that
+        wrap EmissionsCalculator (e.g. ScenarioEmissionsCalculator)
+
+        Returns the ConsumptionIndex and the per-fuelbed weights, scaled by
+        area, or None if neither weights nor area were specified
         """
         self._num_fuelbeds = self._num_ef_look_up_objects
         self._prune_and_validate(consumption_dict)
+        index = self._index_consumption(consumption_dict)
+        return index, self._fuelbed_weights(index, weights, area)
 
-        self.emissions_factors = {}  # for reference by client
-        emissions = {}
-        for category, c_dict in list(consumption_dict.items()):
-            e_c_dict = {}
-            efs_c_dict = {}
-            for sub_category, sc_dict in list(c_dict.items()):
-                e_sc_dict = self._initialize_emissions_inner_dict()
-                efs_sc_dict = self._initialize_emissions_inner_dict()
-                for phase, cp_array in list(sc_dict.items()):
-                    for i in range(self._num_fuelbeds):
-                        look_up = self._ef_lookup_object(i)
-                        for species in self._output_species_set(i)[phase]:
-                            ef = look_up.get(phase=phase,
-                                fuel_category=category,
-                                fuel_sub_category=sub_category,
-                                species=species)
-                            # 'ef' may sometimes be undefined - e.g. for the
-                            # 'residual' phase for certain fuel categories
-                            # set to zero in these cases
-                            ef = ef or 0.0
-                            efs_sc_dict[phase][species][i] = ef
-                            e_sc_dict[phase][species][i] = ef * sc_dict[phase][i]
-                            # logging.debug('%s > %s > %s > %s: %s * %s = %s',
-                            #     category, sub_category, phase,
-                            #     species, ef, sc_dict[phase][i],
-                            #     e_sc_dict[phase][species][i])
-
-                e_c_dict[sub_category] = e_sc_dict
-                efs_c_dict[sub_category] = efs_sc_dict
-            if e_c_dict:
-                emissions[category] = e_c_dict
-                self.emissions_factors[category] = efs_c_dict
-
-        emissions['summary'] = self._compute_summary(emissions)
+    def _index_consumption(self, consumption_dict):
+        """Packs the (pruned and validated) consumption values into a single
+        array, of shape (# sub-categories, # phases, # fuelbeds), so that
+        emissions can be computed in one vectorized operation.
 
+        Phases missing from a sub-category (e.g. pruned when silent_fail is
+        set) are left as zeros and flagged as absent in the 'present' mask.
+        """
+        keys = []
+        category_slices = {}
+        for category, c_dict in list(consumption_dict.items()):
+            start = len(keys)
+            keys.extend([(category, sub_category) for sub_category in c_dict])
+            if len(keys) > start:
+                category_slices[category] = slice(start, len(keys))
+
+        num_fuelbeds = self._num_fuelbeds or 0
+        consumption = numpy.zeros((len(keys), len(self.PHASES), num_fuelbeds))
+        present = numpy.zeros((len(keys), len(self.PHASES)), dtype=bool)
+        for k, (category, sub_category) in enumerate(keys):
+            sc_dict = consumption_dict[category][sub_category]
+            for p, phase in enumerate(self.PHASES):
+                if phase in sc_dict:
+                    consumption[k, p] = sc_dict[phase]
+                    present[k, p] = True
+
+        return ConsumptionIndex(keys, category_slices, consumption, present,
+            num_fuelbeds)
+
+    EF_TENSOR_CACHE_SIZE = 8
+
+    def _ef_tensor(self, index, species=None):
+        """Returns cached EF array for the given consumption structure and
+        species ordering, defaulting to self._species, building and caching
+        it if necessary. The returned array is read-only, since it may be
+        shared across calls.
+        """
+        species = self._species if species is None else species
+        key = (tuple(index.keys), index.present.tobytes(), index.num_fuelbeds,
+            tuple(species))
+        ef_tensor = self._ef_tensor_cache.pop(key, None)
+        if ef_tensor is None:
+            ef_tensor = self._build_ef_tensor(index, species)
+            ef_tensor.flags.writeable = False
+        self._ef_tensor_cache[key] = ef_tensor
+        if len(self._ef_tensor_cache) > self.EF_TENSOR_CACHE_SIZE:
+            self._ef_tensor_cache.popitem(last=False)
+        return ef_tensor
+
+    def _build_ef_tensor(self, index, species):
+        """Returns array of emissions factors, of shape (# sub-categories,
+        # phases, # species, # fuelbeds), with the species axis ordered
+        according to 'species'.
+        """
+        species_idx = {s: j for j, s in enumerate(species)}
+        ef_tensor = numpy.zeros((len(index.keys), len(self.PHASES),
+            len(species), index.num_fuelbeds))
+        for k, (category, sub_category) in enumerate(index.keys):
+            for p, phase in enumerate(self.PHASES):
+                if not index.present[k, p]:
+                    continue
+                for i in range(index.num_fuelbeds):
+                    look_up = self._ef_lookup_object(i)
+                    for s in self._output_species_set(i)[phase]:
+                        ef = look_up.get(phase=phase,
+                            fuel_category=category,
+                            fuel_sub_category=sub_category,
+                            species=s)
+                        # 'ef' may sometimes be undefined - e.g. for the
+                        # 'residual' phase for certain fuel categories
+                        # set to zero in these cases
+                        ef_tensor[k, p, species_idx[s], i] = ef or 0.0
+        return ef_tensor
+
+    def _fuelbed_weights(self, index, weights, area):
+        """Returns array of per-fuelbed weights, scaled by area, or None if
+        neither weights nor area were specified. Area without weights
+        weights every fuelbed by area.
+        """
+        if weights is None:
+            if area is None:
+                return None
+            weights = numpy.ones(index.num_fuelbeds)
+        weights = numpy.asarray(weights, dtype=float)
+        if weights.shape != (index.num_fuelbeds,):
+            raise ValueError(self.ERROR_MESSAGES['INVALID_WEIGHTS'])
+        if not (numpy.isfinite(weights).all() and (weights >= 0).all()):
+            raise ValueError(self.ERROR_MESSAGES['INVALID_WEIGHT_VALUES'])
+        if area is not None:
+            if not (numpy.isfinite(area) and area >= 0):
+                raise ValueError(self.ERROR_MESSAGES['INVALID_AREA'])
+            weights = weights * area
+        return weights
+
+    def _assemble(self, index, emissions_tensor, ef_tensor, weights=None):
+        """Converts emissions and ef arrays, whose species axes are ordered
+        according to self._species, into the nested output dicts.  Sets
+        self.emissions_factors and returns the emissions.
+
+        If weights are specified, emissions are weighted by fuelbed and the
+        fire-level summary is added.
+        """
+        if weights is not None:
+            emissions_tensor = emissions_tensor * weights
+
+        output = self._output_spec
+        self.emissions_factors = _tensor_to_dict(index.keys,
+            index.category_slices, ef_tensor, output)  # for reference by client
+        emissions = _tensor_to_dict(index.keys, index.category_slices,
+            emissions_tensor, output)
+        sums = self._category_sums(index, emissions_tensor)
+        emissions['summary'] = _summary_to_dict(index.category_slices, sums,
+            output)
+        if weights is not None:
+            emissions['fire'] = _summary_to_dict(index.category_slices,
+                sums.sum(axis=-1), output)
         return emissions
 
     ##
     ## Summary
     ##
 
-    def _compute_summary(self, emissions):
-        # TODO: compute emissions['summary'][CATEGORY] for all categories
-        # and then compute emissions['summary']['totals'] from each of the
-        # category summaries
-        summary = {
-            'total': self._initialize_emissions_inner_dict(include_total=True)
-        }
-        for category, e_c_dict in list(emissions.items()):
-            if not e_c_dict:
-                # empty due to no valid subcategories
-                continue
+    def _category_sums(self, index, emissions_tensor):
+        """Returns array of shape (# categories + 1, # phases, # species,
+        # fuelbeds), where the last row is the total over all categories
+        """
+        return numpy.stack([emissions_tensor[sl].sum(axis=0)
+            for sl in index.category_slices.values()]
+            + [emissions_tensor.sum(axis=0)])
 
-            summary[category] = self._initialize_emissions_inner_dict()
-            for sub_category, e_sc_dict in list(e_c_dict.items()):
-                for phase, p_dict in list(e_sc_dict.items()):
-                    for species, s_list in list(p_dict.items()):
-                        for i in range(len(s_list)):
-                            val = s_list[i]
-                            summary[category][phase][species][i] += val
-                            summary['total'][phase][species][i] += val
-                            summary['total']['total'][species][i] += val
-        return summary
 
     ##
     ## Emission Factors and Chemical Species
@@ -260,6 +547,9 @@ class EmissionsCalculator(object):
                 k: reduce(lambda a, b: a.union(b), [os[k] for os in self._output_species])
                     for k in ['flaming', 'smoldering', 'residual']
             }
+        self._species = sorted(set().union(*self._species_by_phase.values()))
+        self._output_spec = _output_spec(self._species, self._species_by_phase,
+            self._output_arrays)
 
     ##
     ## Data Validation
@@ -269,6 +559,7 @@ class EmissionsCalculator(object):
         'debug',
         'summary'
     }
+    PHASES = ('flaming', 'smoldering', 'residual')
     VALID_PHASES = {
         'flaming',
         'smoldering',
@@ -319,43 +610,42 @@ class EmissionsCalculator(object):
                         sc_dict.pop(phase)
                         continue
 
-                    p_array_len = None
-                    try:
-                        # TODO: make sure it's a list or numpy array, not just
-                        # that it can be caste to an list (since, for example,
-                        # a dict can be caste to an array)
-                        p_array_len = len(list(p_array))
-                    except:
-                        # p_array must not be a list or list-compatible
-                        pass
+                    p_array_len, valid_values = self._check_phase_array(p_array)
                     self._num_fuelbeds = self._num_fuelbeds or p_array_len
                     if not p_array_len or p_array_len != self._num_fuelbeds:
-                        if self._silent_fail:
-                            logging.info('Ignoring sub-category %s', phase)
-                            sc_dict.pop(phase)
-                            continue
-                        else:
-                            raise InvalidConsumptionDataError(
-                                self.ERROR_MESSAGES['INVALID_INPUT_DATA_LENGTH_MISMATCH'] % (
-                                category, sub_category, phase))
+                        error = 'INVALID_INPUT_DATA_LENGTH_MISMATCH'
+                    elif not valid_values:
+                        error = 'INVALID_INPUT_DATA_VALUES'
+                    else:
+                        continue
 
-    ##
-    ## Data Initialization
-    ##
+                    if self._silent_fail:
+                        logging.info('Ignoring sub-category %s', phase)
+                        sc_dict.pop(phase)
+                    else:
+                        raise InvalidConsumptionDataError(
+                            self.ERROR_MESSAGES[error] % (
+                            category, sub_category, phase))
 
-    def _initialize_emissions_inner_dict(self, include_total=False):
-        """Initializes each combustion phase's species-specific emissions
-        arrays to 0.0's so that, even if the ef-lookup object has different
-        sets of chemical species for the various fuelbeds, each emissions
-        array will be the same length).
+    VALID_VALUE_KINDS = 'fiu'
+
+    def _check_phase_array(self, p_array):
+        """Returns the length of p_array, or None if it isn't a flat array,
+        and whether or not its values are all finite, non-boolean numbers
         """
-        d = {
-            k: dict([(e, [0.0] * self._num_fuelbeds) for e in self._species_by_phase[k]])
-                for k in ['flaming', 'smoldering', 'residual']
-        }
-        if include_total:
-            all_species = reduce(lambda a, b: a.union(b),
-                list(self._species_by_phase.values()))
-            d['total'] = dict([(e, [0.0] * self._num_fuelbeds)
-                for e in all_species])
-        return d
+        try:
+            # Note: unlike a python list, a dict isn't converted to a 1-d array
+            a = numpy.asarray(p_array)
+        except:
+            # e.g. ragged nested lists
+            return None, False
+        if a.ndim != 1:
+            return None, False
+
+        valid_values = (a.dtype.kind in self.VALID_VALUE_KINDS
+            and bool(numpy.isfinite(a).all()))
+        if valid_values and not isinstance(p_array, numpy.ndarray):
+            # numpy casts booleans mixed with numbers to numbers
+            valid_values = not any(isinstance(v, (bool, numpy.bool_))
+                for v in p_array)
+        return len(a), valid_values
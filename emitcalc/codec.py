@@ -0,0 +1,91 @@
+"""Fast JSON decoding and encoding of consume output and emissions
+
+Flat arrays of numbers, not including booleans, such as the per-fuelbed
+phase arrays in consume output, are decoded into float64 numpy arrays, and
+numpy arrays, such as those output by EmissionsCalculator when constructed
+with output_arrays=True, are encoded in bulk.  orjson, if installed (pip
+install emitcalc[fast-json]), is used for both, with orjson encoding numpy
+arrays natively, without creating a python float per value; otherwise, the
+json module is used.
+"""
+
+__author__      = "Joel Dubowy"
+
+import json
+
+import numpy
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+__all__ = [
+    'loads',
+    'load',
+    'dumps',
+    'dump'
+]
+
+##
+## Decoding
+##
+
+def loads(s):
+    """Parses JSON, decoding flat arrays of numbers into float64 numpy arrays.
+
+    NaN and Infinity, which aren't valid JSON, are rejected, as they are by
+    orjson, regardless of which is used.
+    """
+    if _orjson:
+        return _to_arrays(_orjson.loads(s))
+    return _to_arrays(json.loads(s, parse_constant=_reject_constant))
+
+def load(fp):
+    return loads(fp.read())
+
+def _reject_constant(constant):
+    raise ValueError("Invalid JSON constant {}".format(constant))
+
+_NUMBER_TYPES = {float, int}
+
+def _to_arrays(obj):
+    if isinstance(obj, dict):
+        return {k: _to_arrays(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        # the type check is done in bulk, without running python code per
+        # value, and excludes booleans, whose type is bool, not int
+        types = set(map(type, obj))
+        if types and types <= _NUMBER_TYPES:
+            return numpy.array(obj, dtype=numpy.float64)
+        return [_to_arrays(v) for v in obj]
+    return obj
+
+##
+## Encoding
+##
+
+def dumps(obj, indent=None):
+    """Serializes obj, which may contain numpy arrays and scalars, to JSON.
+
+    Note: orjson only supports an indent of 2, so, with any other indent, the
+    json module is used.
+    """
+    if _orjson and indent in (None, 2):
+        option = _orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= _orjson.OPT_INDENT_2
+        # non-contiguous arrays fall through to _default
+        return _orjson.dumps(obj, default=_default, option=option).decode()
+    return json.dumps(obj, indent=indent, default=_default)
+
+def dump(obj, fp, indent=None):
+    fp.write(dumps(obj, indent=indent))
+
+def _default(obj):
+    if isinstance(obj, numpy.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, numpy.generic):
+        return obj.item()
+    raise TypeError("Object of type {} is not JSON serializable".format(
+        type(obj).__name__))
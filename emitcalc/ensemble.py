@@ -0,0 +1,198 @@
+__author__      = "Joel Dubowy"
+
+import numpy
+
+from .calculator import EmissionsCalculator, _summary_to_dict
+
+__all__ = [
+    'EnsembleEmissionsCalculator'
+]
+
+class EnsembleEmissionsCalculator(object):
+
+    DEFAULT_PERCENTILES = [5, 50, 95]
+    DEFAULT_CHUNK_SIZE = 100
+
+    def __init__(self, ef_lookup_objects, **options):
+        """EnsembleEmissionsCalculator constructor
+
+        Args:
+         - ef_lookup_objects -- either an array of look-up objects or a
+           single one (see EmissionsCalculator)
+
+        Options:
+         - silent_fail, species -- see EmissionsCalculator
+         - percentiles -- percentiles to compute for each category, phase,
+           species, and fuelbed; defaults to [5, 50, 95]
+         - seed -- seed for the random number generator used to sample
+           from distributions
+         - chunk_size -- max number of ensemble members to compute at once,
+           which bounds memory usage; defaults to 100
+        """
+        self._calculator = EmissionsCalculator(ef_lookup_objects,
+            silent_fail=options.get('silent_fail'),
+            species=options.get('species', []))
+        self._percentiles = list(options.get('percentiles',
+            self.DEFAULT_PERCENTILES))
+        self._rng = numpy.random.default_rng(options.get('seed'))
+        self._chunk_size = options.get('chunk_size') or self.DEFAULT_CHUNK_SIZE
+
+    @property
+    def species(self):
+        """Ordering of the species axis of EF sample arrays"""
+        return list(self._calculator._species)
+
+    ##
+    ## Public Interface
+    ##
+
+    def calculate(self, consumption_dict, num_members=None,
+            consumption_perturbation=None, ef_perturbation=None):
+        """Calculates summary statistics of emissions over an ensemble of
+        perturbed consumption values and/or emissions factors
+
+        Arguments
+         - consumption_dict -- dictionary of consume output, of the same
+           form as accepted by EmissionsCalculator.calculate
+
+        Kwargs
+         - num_members -- number of ensemble members; required unless
+           inferred from a sample array
+         - consumption_perturbation -- multiplicative perturbation of
+           consumption values (see note below)
+         - ef_perturbation -- multiplicative perturbation of emissions
+           factors (see note below)
+
+        Note: each perturbation is either a dict specifying a distribution
+        from which a factor is independently sampled for every value, e.g.
+
+            {'distribution': 'normal', 'sigma': 0.2}  # see note below
+            {'distribution': 'lognormal', 'sigma': 0.2}  # median 1
+            {'distribution': 'uniform', 'low': 0.8, 'high': 1.2}
+
+        or an array of sampled factors whose first axis is the ensemble
+        member and whose remaining axes broadcast against (# sub-categories,
+        # phases, # fuelbeds) for consumption or (# sub-categories,
+        # phases, # species, # fuelbeds) for emissions factors. For example,
+        an array of shape (M, 1, 1, F) perturbs consumption per member and
+        fuelbed, and one of shape (M, 1, 1, S, 1) perturbs EFs per member
+        and species, ordered according to self.species.
+
+        The 'normal' distribution has mean 1 and is truncated at 0, with
+        negative samples being redrawn, so its mean exceeds 1 once sigma is
+        large enough for truncation to matter (e.g. by ~3% for sigma 0.5).
+
+        Returns dict keyed by statistic - 'mean', 'variance', and 'p<N>' for
+        each percentile N - with each value being of the same form as the
+        'summary' section of EmissionsCalculator.calculate's output. Individual
+        ensemble members' emissions are never converted to nested dicts.
+        """
+        index, _ = self._calculator._validate_and_index(consumption_dict)
+        ef_tensor = self._calculator._ef_tensor(index)
+
+        num_members = self._num_members(num_members,
+            consumption_perturbation, ef_perturbation)
+
+        # shape: (# members, # categories + 1, # phases + 1, # species,
+        # fuelbeds), where the last category is the total over all
+        # categories and the last phase is the total over all phases; totals
+        # are computed per member, since statistics of sums aren't sums of
+        # statistics
+        slices = list(index.category_slices.values())
+        num_phases, num_species = ef_tensor.shape[1:3]
+        sums = numpy.empty((num_members, len(slices) + 1, num_phases + 1,
+            num_species, index.num_fuelbeds))
+        for start in range(0, num_members, self._chunk_size):
+            stop = min(start + self._chunk_size, num_members)
+            consumption = index.consumption * self._factors(
+                consumption_perturbation, start, stop, index.consumption.shape)
+            efs = ef_tensor * self._factors(
+                ef_perturbation, start, stop, ef_tensor.shape)
+            emissions = consumption[:, :, :, numpy.newaxis, :] * efs
+            for j, sl in enumerate(slices):
+                sums[start:stop, j, :-1] = emissions[:, sl].sum(axis=1)
+            sums[start:stop, -1, :-1] = emissions.sum(axis=1)
+            sums[start:stop, :, -1] = sums[start:stop, :, :-1].sum(axis=2)
+
+        stats = {
+            'mean': sums.mean(axis=0),
+            'variance': sums.var(axis=0)
+        }
+        if self._percentiles:
+            for p, a in zip(self._percentiles,
+                    numpy.percentile(sums, self._percentiles, axis=0)):
+                stats['p{}'.format(p)] = a
+
+        # the phase totals, in the last phase row, are output as 'total'
+        return {
+            stat: _summary_to_dict(index.category_slices, a[:, :-1],
+                self._calculator._output_spec, totals=a[-1, -1])
+                    for stat, a in list(stats.items())
+        }
+
+    ##
+    ## Sampling
+    ##
+
+    # distribution names mapped to their required parameters
+    DISTRIBUTIONS = {
+        'normal': ['sigma'],
+        'lognormal': ['sigma'],
+        'uniform': ['low', 'high']
+    }
+
+    def _num_members(self, num_members, *perturbations):
+        for p in perturbations:
+            if p is not None and not hasattr(p, 'items'):
+                n = len(p)
+                if num_members is not None and num_members != n:
+                    raise ValueError("Number of ensemble members doesn't "
+                        "match perturbation sample arrays")
+                num_members = n
+        if not num_members:
+            raise ValueError("Number of ensemble members must be specified")
+        return num_members
+
+    def _factors(self, perturbation, start, stop, shape):
+        """Returns multiplicative factors for ensemble members start through
+        stop - 1, broadcastable to (stop - start,) + shape
+        """
+        if perturbation is None:
+            return numpy.ones((1,) + (1,) * len(shape))
+
+        if not hasattr(perturbation, 'items'):
+            a = numpy.asarray(perturbation, dtype=float)[start:stop]
+            # insert any missing axes after the member axis, so that the
+            # remaining axes broadcast, right-aligned, against 'shape'
+            return a.reshape(a.shape[:1] + (1,) * (len(shape) + 1 - a.ndim)
+                + a.shape[1:])
+
+        size = (stop - start,) + shape
+        distribution = perturbation.get('distribution')
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError("Invalid distribution {} - must be one of {}".format(
+                distribution, ', '.join(sorted(self.DISTRIBUTIONS))))
+        missing = [k for k in self.DISTRIBUTIONS[distribution]
+            if k not in perturbation]
+        if missing:
+            raise ValueError("Distribution {} requires {}".format(
+                distribution, ', '.join(missing)))
+
+        if distribution == 'normal':
+            return self._truncated_normal(perturbation['sigma'], size)
+        elif distribution == 'lognormal':
+            return self._rng.lognormal(0.0, perturbation['sigma'], size)
+        else:
+            return self._rng.uniform(perturbation['low'],
+                perturbation['high'], size)
+
+    def _truncated_normal(self, sigma, size):
+        """Samples from normal distribution with mean 1, redrawing negative
+        samples until there are none
+        """
+        factors = self._rng.normal(1.0, sigma, size)
+        negative = factors < 0.0
+        while negative.any():
+            factors[negative] = self._rng.normal(1.0, sigma, negative.sum())
+            negative = factors < 0.0
+        return factors
@@ -0,0 +1,100 @@
+__author__      = "Joel Dubowy"
+
+import numpy
+
+from .calculator import EmissionsCalculator
+
+__all__ = [
+    'ScenarioEmissionsCalculator'
+]
+
+class ScenarioEmissionsCalculator(object):
+
+    def __init__(self, scenarios, **options):
+        """ScenarioEmissionsCalculator constructor
+
+        Args:
+         - scenarios -- dict mapping scenario name to ef look-up object(s),
+           each value being what would be passed to EmissionsCalculator
+           (either an array of look-up objects or a single one)
+
+        Options:
+         - same as those supported by EmissionsCalculator, and applied to
+           every scenario
+
+        Notes:
+         - scenarios using arrays of look-up objects must all have the same
+           number of them, since the number of look-up objects determines
+           the number of fuelbeds expected in the consumption data
+        """
+        if not scenarios:
+            raise ValueError("At least one scenario must be specified")
+
+        self._calculators = {
+            name: EmissionsCalculator(ef_lookup_objects, **options)
+                for name, ef_lookup_objects in list(scenarios.items())
+        }
+
+        num_ef_look_up_objects = set([c._num_ef_look_up_objects
+            for c in self._calculators.values()]) - {None}
+        if len(num_ef_look_up_objects) > 1:
+            raise ValueError("Scenarios must all specify the same number "
+                "of ef look-up objects")
+
+        # One calculator validates and indexes the consumption data for all
+        # scenarios; if any scenario has per-fuelbed look-up objects, it must
+        # be one of those, so that number of fuelbeds is enforced
+        self._validator = next((c for c in self._calculators.values()
+            if c._num_ef_look_up_objects is not None),
+            next(iter(self._calculators.values())))
+
+        self._species = sorted(set().union(
+            *[c._species for c in self._calculators.values()]))
+        self._species_columns = {
+            name: [self._species.index(s) for s in c._species]
+                for name, c in list(self._calculators.items())
+        }
+
+    ##
+    ## Public Interface
+    ##
+
+    def calculate(self, consumption_dict, weights=None, area=None):
+        """Calculates emissions for each scenario given consume output
+
+        Arguments
+         - consumption_dict -- dictionary of consume output, of the same
+           form as accepted by EmissionsCalculator.calculate
+
+        Kwargs
+         - weights, area -- optional per-fuelbed weights and total area,
+           applied to every scenario (see EmissionsCalculator.calculate)
+
+        Returns dict mapping scenario name to emissions, each of the same
+        form as returned by EmissionsCalculator.calculate. The emissions
+        factors used for each scenario are available, keyed by scenario
+        name, in self.emissions_factors.
+
+        The consumption data are validated and indexed once, and emissions
+        for all scenarios are computed in one operation over a stacked
+        array of emissions factors.
+        """
+        index, weights = self._validator._validate_and_index(consumption_dict,
+            weights, area)
+
+        # shape: (# scenarios, # sub-categories, # phases, # species, # fuelbeds)
+        ef_tensors = numpy.stack([c._ef_tensor(index, self._species)
+            for c in self._calculators.values()])
+        emissions_tensors = (index.consumption[numpy.newaxis, :, :, numpy.newaxis, :]
+            * ef_tensors)
+
+        self.emissions_factors = {}  # for reference by client
+        emissions = {}
+        for j, (name, c) in enumerate(self._calculators.items()):
+            cols = self._species_columns[name]
+            emissions[name] = c._assemble(index,
+                emissions_tensors[j][:, :, cols], ef_tensors[j][:, :, cols],
+                weights)
+            self.emissions_factors[name] = c.emissions_factors
+
+        return emissions
@@ -0,0 +1,245 @@
+__author__      = "Joel Dubowy"
+
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+from .calculator import (
+    EmissionsCalculator, _output_spec, _summary_to_dict, _tensor_to_dict
+)
+
+__all__ = [
+    'SharedMemoryEmissionsCalculator',
+    'SharedEmissions'
+]
+
+def _shared_memory(**kwargs):
+    """Returns SharedMemory that isn't tracked by this process's resource
+    tracker, so that the block isn't unlinked when the process that created
+    or attached to it exits; blocks are explicitly unlinked instead (see
+    SharedEmissions.unlink)
+    """
+    try:
+        return shared_memory.SharedMemory(track=False, **kwargs)
+    except TypeError:
+        # python < 3.13; blocks are only tracked on posix systems, where
+        # they're registered by name with a leading '/'
+        shm = shared_memory.SharedMemory(**kwargs)
+        if os.name == 'posix':
+            resource_tracker.unregister('/' + shm.name, 'shared_memory')
+        return shm
+
+class _SharedBuffer(object):
+    """Exports a SharedMemory's buffer, keeping the SharedMemory referenced
+    for as long as the export - e.g. via an array - is; see
+    SharedEmissions.detach
+    """
+
+    def __init__(self, shm):
+        self._shm = shm
+
+    def __buffer__(self, flags):
+        return self._shm.buf.__buffer__(flags)
+
+class SharedEmissions(object):
+    """Small, picklable descriptor of emissions, emissions factors, and
+    summaries living in a named shared memory block
+
+    Arrays, each of which is a view into the shared memory block:
+     - emissions -- shape (# sub-categories, # phases, # species, # fuelbeds)
+     - emissions_factors -- same shape as emissions
+     - summary -- shape (# categories + 1, # phases, # species, # fuelbeds),
+       with the last row being the total over all categories
+     - fire -- only if weights or area were specified; same as summary, but
+       summed across fuelbeds
+
+    Consumers call attach() (or use the descriptor as a context manager) to
+    access the arrays, and detach() when done; arrays already obtained remain
+    valid after detaching. Exactly one process, typically the last consumer,
+    must call unlink() to free the block.
+    """
+
+    def __init__(self, name, layout, keys, category_slices, output):
+        self.name = name
+        self._layout = layout
+        self.keys = keys
+        self.category_slices = category_slices
+        self._output = output
+        self._shm = None
+
+    @property
+    def species(self):
+        """Ordering of the arrays' species axis"""
+        return self._output.species
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shm'] = None
+        return state
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detach()
+
+    ##
+    ## Shared memory
+    ##
+
+    def attach(self):
+        if self._shm is None:
+            self._shm = _shared_memory(name=self.name)
+        return self
+
+    def detach(self):
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # Arrays obtained from this descriptor are still referenced;
+                # they keep the SharedMemory, and thus the mapping, alive
+                # (see _array), and it's closed when they're garbage
+                # collected, so just drop this reference to it
+                pass
+            self._shm = None
+
+    def unlink(self):
+        """Removes the shared memory block's name, so that its memory is
+        freed once all processes have detached and dropped any arrays
+        obtained from it
+        """
+        self.attach()
+        self._shm.unlink()
+        self.detach()
+
+    def _array(self, name):
+        if self._shm is None:
+            raise RuntimeError("SharedEmissions not attached")
+        offset, shape = self._layout[name]
+        # Note: numpy.frombuffer keeps the memoryview, and thus its export of
+        # the block's buffer, for as long as the array is referenced, which
+        # prevents the block from being closed; the memoryview, in turn,
+        # references the SharedMemory via _SharedBuffer, so that the block is
+        # closed once the array is garbage collected (see detach)
+        return numpy.frombuffer(memoryview(_SharedBuffer(self._shm)),
+            dtype=numpy.float64, count=int(numpy.prod(shape)),
+            offset=offset).reshape(shape)
+
+    @property
+    def emissions(self):
+        return self._array('emissions')
+
+    @property
+    def emissions_factors(self):
+        return self._array('emissions_factors')
+
+    @property
+    def summary(self):
+        return self._array('summary')
+
+    @property
+    def fire(self):
+        return self._array('fire') if 'fire' in self._layout else None
+
+    ##
+    ## Nested dicts
+    ##
+
+    def to_dict(self):
+        """Returns emissions in the same form as EmissionsCalculator.calculate
+        with output_arrays=True. Arrays are views into the shared memory
+        block, so nothing is copied.
+        """
+        emissions = _tensor_to_dict(self.keys, self.category_slices,
+            self.emissions, self._output)
+        emissions['summary'] = _summary_to_dict(self.category_slices,
+            self.summary, self._output)
+        if self.fire is not None:
+            emissions['fire'] = _summary_to_dict(self.category_slices,
+                self.fire, self._output)
+        return emissions
+
+    def emissions_factors_dict(self):
+        return _tensor_to_dict(self.keys, self.category_slices,
+            self.emissions_factors, self._output)
+
+class SharedMemoryEmissionsCalculator(object):
+
+    def __init__(self, ef_lookup_objects, **options):
+        """SharedMemoryEmissionsCalculator constructor
+
+        Args:
+         - ef_lookup_objects -- either an array of look-up objects or a
+           single one (see EmissionsCalculator)
+
+        Options:
+         - silent_fail, species -- see EmissionsCalculator
+        """
+        self._calculator = EmissionsCalculator(ef_lookup_objects,
+            silent_fail=options.get('silent_fail'),
+            species=options.get('species', []))
+
+    ##
+    ## Public Interface
+    ##
+
+    def calculate(self, consumption_dict, weights=None, area=None):
+        """Calculates emissions given consume output, writing them, along
+        with the emissions factors and summaries, directly into a new named
+        shared memory block
+
+        Arguments and kwargs are the same as for EmissionsCalculator.calculate
+
+        Returns a SharedEmissions descriptor, which is small and cheap to
+        pickle, and via which other processes can read the arrays without
+        copying or re-serializing them. The caller is attached to the block,
+        and should detach when done with it.
+        """
+        c = self._calculator
+        index, weights = c._validate_and_index(consumption_dict, weights, area)
+        ef_tensor = c._ef_tensor(index)
+
+        shape = ef_tensor.shape
+        summary_shape = (len(index.category_slices) + 1,) + shape[1:]
+        shapes = [
+            ('emissions', shape),
+            ('emissions_factors', shape),
+            ('summary', summary_shape)
+        ]
+        if weights is not None:
+            shapes.append(('fire', summary_shape[:-1]))
+
+        layout = {}
+        size = 0
+        for name, s in shapes:
+            layout[name] = (size, s)
+            size += int(numpy.prod(s)) * numpy.dtype(numpy.float64).itemsize
+
+        shm = _shared_memory(create=True, size=max(size, 1))
+        shared = SharedEmissions(shm.name, layout, index.keys,
+            index.category_slices, _output_spec(c._species,
+            {k: sorted(v) for k, v in c._species_by_phase.items()},
+            output_arrays=True))
+        shared._shm = shm
+
+        try:
+            emissions = shared.emissions
+            numpy.multiply(index.consumption[:, :, numpy.newaxis, :],
+                ef_tensor, out=emissions)
+            if weights is not None:
+                emissions *= weights
+            shared.emissions_factors[...] = ef_tensor
+
+            summary = shared.summary
+            for j, sl in enumerate(index.category_slices.values()):
+                numpy.sum(emissions[sl], axis=0, out=summary[j])
+            numpy.sum(emissions, axis=0, out=summary[-1])
+            if weights is not None:
+                numpy.sum(summary, axis=-1, out=shared.fire)
+        except:
+            shared.unlink()
+            raise
+
+        return shared
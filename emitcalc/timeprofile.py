@@ -0,0 +1,104 @@
+__author__      = "Joel Dubowy"
+
+from collections import namedtuple
+
+import numpy
+
+__all__ = [
+    'HourlyProfiler',
+    'HourlyEmissions'
+]
+
+# species - list of chemical species, ordering the species axis of 'values'
+# values - array of shape (# hours, # species), or, if computed per fuelbed,
+#   (# hours, # species, # fuelbeds)
+HourlyEmissions = namedtuple('HourlyEmissions', ['species', 'values'])
+
+class HourlyProfiler(object):
+
+    PHASES = ('flaming', 'smoldering', 'residual')
+
+    def __init__(self, hourly_fractions):
+        """HourlyProfiler constructor
+
+        Args:
+         - hourly_fractions -- dict mapping each combustion phase to an
+           array of the fractions of that phase's emissions released in
+           each hour, or a single array to be used for all phases; each
+           array is either of shape (# hours,), applying to all fuelbeds,
+           or (# fuelbeds, # hours)
+
+        Notes:
+         - fractions aren't required to sum to 1, e.g. if a profile only
+           covers part of a fire's duration
+        """
+        if not hasattr(hourly_fractions, 'items'):
+            hourly_fractions = {p: hourly_fractions for p in self.PHASES}
+
+        missing = set(self.PHASES) - set(hourly_fractions)
+        if missing:
+            raise ValueError("Missing hourly fractions for phase(s) {}".format(
+                ', '.join(sorted(missing))))
+
+        fractions = [numpy.asarray(hourly_fractions[p], dtype=float)
+            for p in self.PHASES]
+        if any(f.ndim not in (1, 2) for f in fractions):
+            raise ValueError("Hourly fractions must be of shape (# hours,) "
+                "or (# fuelbeds, # hours)")
+        if len(set(f.shape[-1] for f in fractions)) > 1:
+            raise ValueError("Hourly fractions must have the same number "
+                "of hours for all phases")
+
+        # shape: (# phases, # fuelbeds or 1, # hours)
+        self._fractions = numpy.stack(numpy.broadcast_arrays(
+            *[f if f.ndim == 2 else f[numpy.newaxis, :] for f in fractions]))
+
+    @property
+    def num_hours(self):
+        return self._fractions.shape[-1]
+
+    ##
+    ## Public Interface
+    ##
+
+    def profile(self, emissions, per_fuelbed=False, category='total'):
+        """Allocates phase-level emissions across hours
+
+        Arguments
+         - emissions -- output of EmissionsCalculator.calculate
+
+        Kwargs
+         - per_fuelbed -- if True, hourly emissions are returned for each
+           fuelbed; otherwise, they're summed across fuelbeds
+         - category -- 'summary' category whose phase-level emissions are
+           allocated; defaults to 'total'
+
+        Returns HourlyEmissions, with values computed as a single outer
+        product of the hourly fractions and the (# phases, # species,
+        # fuelbeds) array of phase-level emissions.
+        """
+        phase_emissions = emissions['summary'][category]
+        species = sorted(set().union(
+            *[phase_emissions[p].keys() for p in self.PHASES]))
+        species_idx = {s: j for j, s in enumerate(species)}
+
+        num_fuelbeds = next((len(v) for p in self.PHASES
+            for v in phase_emissions[p].values()), 0)
+        if self._fractions.shape[1] not in (1, num_fuelbeds):
+            raise ValueError("Number of fuelbeds in hourly fractions doesn't "
+                "match the number in the emissions")
+
+        # shape: (# phases, # species, # fuelbeds)
+        e = numpy.zeros((len(self.PHASES), len(species), num_fuelbeds))
+        for p, phase in enumerate(self.PHASES):
+            for s, values in list(phase_emissions[phase].items()):
+                e[p, species_idx[s]] = values
+
+        fractions = numpy.broadcast_to(self._fractions,
+            (len(self.PHASES), num_fuelbeds, self.num_hours))
+        if per_fuelbed:
+            values = numpy.einsum('pfh,psf->hsf', fractions, e)
+        else:
+            values = numpy.einsum('pfh,psf->hs', fractions, e)
+
+        return HourlyEmissions(species, values)
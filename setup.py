@@ -33,6 +33,11 @@ setup(
         "eflookup>=5.0.0,<6.0.0",
         "numpy==2.1.1",
     ],
+    extras_require={
+        # used by emitcalc.codec, if installed, for faster JSON parsing and
+        # serialization
+        "fast-json": ["orjson>=3.9.0"]
+    },
     dependency_links=[
         "https://pypi.airfire.org/simple/afscripting/"
         "https://pypi.airfire.org/simple/eflookup/"
@@ -0,0 +1,24 @@
+__author__      = "Joel Dubowy"
+
+from test_calculator import (
+    BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT,
+    LITTER_RX_13_130_CONSUME_OUT,
+    LOOK_UP_DIFFERING_RX_13, LOOK_UP_DIFFERING_RX_130
+)
+
+CONSUME_OUTPUT = {
+    "ground fuels": {
+        "basal accumulations": BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT
+    },
+    "litter-lichen-moss": {
+        "litter": LITTER_RX_13_130_CONSUME_OUT
+    }
+}
+
+LOOK_UPS = [LOOK_UP_DIFFERING_RX_13, LOOK_UP_DIFFERING_RX_130]
+
+def list_values(d):
+    """Converts the arrays in nested dict d to lists, for comparison"""
+    if isinstance(d, dict):
+        return {k: list_values(v) for k, v in d.items()}
+    return d.tolist()
@@ -0,0 +1,141 @@
+__author__      = "Joel Dubowy"
+
+import copy
+import json
+import os
+
+from emitcalc.batch import BatchRunner, find_input_files
+from emitcalc.calculator import EmissionsCalculator
+
+from test_calculator import (
+    BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT,
+    LOOK_UP_RX_13, LOOK_UP_RX_130, LOOK_UP_WF_13, LOOK_UP_WF_130,
+    assert_results_are_approximately_equal
+)
+
+CONSUME_OUTPUT = {
+    "ground fuels": {
+        "basal accumulations": BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT
+    }
+}
+
+LOOK_UPS = {
+    'rx': [LOOK_UP_RX_13, LOOK_UP_RX_130],
+    'wf': [LOOK_UP_WF_13, LOOK_UP_WF_130]
+}
+
+class LookupFactory(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ef_model):
+        self.calls.append(ef_model)
+        return LOOK_UPS[ef_model]
+
+def _write_inputs(input_dir, ef_models):
+    os.makedirs(input_dir)
+    for i, ef_model in enumerate(ef_models):
+        data = copy.deepcopy(CONSUME_OUTPUT)
+        if ef_model:
+            data['ef_model'] = ef_model
+        with open(os.path.join(input_dir, '{}.json'.format(i)), 'w') as f:
+            json.dump(data, f)
+
+def _expected(ef_model):
+    return EmissionsCalculator(LOOK_UPS[ef_model]).calculate(
+        copy.deepcopy(CONSUME_OUTPUT))
+
+def _actual(output_dir, i):
+    with open(os.path.join(output_dir, '{}.json'.format(i))) as f:
+        return json.load(f)
+
+class TestFindInputFiles:
+
+    def test_directory_and_glob(self, tmp_path):
+        input_dir = str(tmp_path / 'in')
+        _write_inputs(input_dir, [None, None, None])
+        open(os.path.join(input_dir, 'README'), 'w').close()
+        assert [os.path.basename(f) for f in find_input_files(input_dir)] == [
+            '0.json', '1.json', '2.json']
+        assert [os.path.basename(f) for f in find_input_files(
+            os.path.join(input_dir, '[12].json'))] == ['1.json', '2.json']
+
+class TestBatchRunner:
+
+    def test_ef_model_precedence(self, tmp_path):
+        input_dir = str(tmp_path / 'in')
+        output_dir = str(tmp_path / 'out')
+        _write_inputs(input_dir, ['rx', 'rx', None, 'wf'] * 5)
+        lookup_factory = LookupFactory()
+        runner = BatchRunner(lookup_factory, num_workers=2,
+            default_ef_model='wf', manifest={'1.json': 'wf'})
+        failures = runner.run(find_input_files(input_dir), output_dir)
+        assert failures == {}
+
+        for i in range(20):
+            # manifest, then file, then default
+            if i == 1 or i % 4 in (2, 3):
+                ef_model = 'wf'
+            else:
+                ef_model = 'rx'
+            assert_results_are_approximately_equal(_expected(ef_model),
+                _actual(output_dir, i))
+
+        # calculators are reused across files
+        assert sorted(lookup_factory.calls) == ['rx', 'wf']
+
+    def test_manifest_paths_normalized(self, tmp_path):
+        input_dir = str(tmp_path / 'in')
+        output_dir = str(tmp_path / 'out')
+        _write_inputs(input_dir, [None, None, None, None])
+        manifest = {
+            os.path.join(input_dir, '0.json'): 'wf',
+            './in/1.json': 'wf',
+            'in/../in/2.json': 'wf'
+        }
+        failures = BatchRunner(LookupFactory(), default_ef_model='rx',
+            manifest=manifest, manifest_dir=str(tmp_path)).run(
+            find_input_files(input_dir), output_dir)
+        assert failures == {}
+        for i, ef_model in enumerate(['wf', 'wf', 'wf', 'rx']):
+            assert_results_are_approximately_equal(_expected(ef_model),
+                _actual(output_dir, i))
+
+    def test_failures_dont_stop_batch(self, tmp_path):
+        input_dir = str(tmp_path / 'in')
+        output_dir = str(tmp_path / 'out')
+        _write_inputs(input_dir, ['rx', None, 'rx'])
+        with open(os.path.join(input_dir, '3.json'), 'w') as f:
+            f.write('{ invalid json')
+        failures = BatchRunner(LookupFactory()).run(
+            find_input_files(input_dir), output_dir)
+        assert set(os.path.basename(f) for f in failures) == {'1.json', '3.json'}
+        assert sorted(os.listdir(output_dir)) == ['0.json', '2.json']
+
+    def test_same_named_files_in_sibling_directories(self, tmp_path):
+        output_dir = str(tmp_path / 'out')
+        for sub_dir, ef_model in (('a', 'rx'), ('b', 'wf')):
+            os.makedirs(str(tmp_path / sub_dir))
+            data = dict(copy.deepcopy(CONSUME_OUTPUT), ef_model=ef_model)
+            with open(str(tmp_path / sub_dir / 'x.json'), 'w') as f:
+                json.dump(data, f)
+        failures = BatchRunner(LookupFactory()).run(
+            find_input_files(str(tmp_path / '*' / 'x.json')), output_dir)
+        assert failures == {}
+        for sub_dir, ef_model in (('a', 'rx'), ('b', 'wf')):
+            assert_results_are_approximately_equal(_expected(ef_model),
+                _actual(os.path.join(output_dir, sub_dir), 'x'))
+
+    def test_output_efs(self, tmp_path):
+        input_dir = str(tmp_path / 'in')
+        output_dir = str(tmp_path / 'out')
+        _write_inputs(input_dir, ['rx'])
+        BatchRunner(LookupFactory(), output_efs=True).run(
+            find_input_files(input_dir), output_dir)
+        with open(os.path.join(output_dir, '0.json')) as f:
+            emissions, efs = [json.loads(l) for l in f.read().split('\n')]
+        calculator = EmissionsCalculator(LOOK_UPS['rx'])
+        assert_results_are_approximately_equal(
+            calculator.calculate(copy.deepcopy(CONSUME_OUTPUT)), emissions)
+        assert_results_are_approximately_equal(
+            calculator.emissions_factors, efs)
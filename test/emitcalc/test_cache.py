@@ -0,0 +1,237 @@
+__author__      = "Joel Dubowy"
+
+import copy
+import os
+import time
+
+import numpy
+from numpy.testing import assert_array_equal
+from pytest import raises
+
+from emitcalc import calculator
+from emitcalc.cache import ResultCache
+from emitcalc.calculator import EmissionsCalculator
+
+from helpers import list_values
+from test_calculator import (
+    BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT,
+    LITTER_RX_13_130_CONSUME_OUT,
+    LOOK_UP_RX_13, LOOK_UP_RX_130, LOOK_UP_WF_13, LOOK_UP_WF_130,
+    assert_results_are_approximately_equal
+)
+
+CONSUME_OUTPUT = {
+    "ground fuels": {
+        "basal accumulations": BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT
+    }
+}
+
+OTHER_CONSUME_OUTPUT = {
+    "ground fuels": {
+        "basal accumulations": LITTER_RX_13_130_CONSUME_OUT
+    }
+}
+
+LOOK_UPS = [LOOK_UP_RX_13, LOOK_UP_RX_130]
+
+class CountingResultCache(ResultCache):
+    def __init__(self, **options):
+        super(CountingResultCache, self).__init__(**options)
+        self.hits = 0
+
+    def get(self, key):
+        value = super(CountingResultCache, self).get(key)
+        if value is not None:
+            self.hits += 1
+        return value
+
+class TestResultCache:
+
+    def test_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_max_bytes(self):
+        a = numpy.zeros(1000)
+        cache = ResultCache(max_bytes=3 * a.nbytes)
+        cache.set('a', {'b': a})
+        cache.set('c', {'d': a.copy()})
+        assert cache.get('a') is not None
+        cache.set('e', {'f': a.copy()})
+        assert len(cache) == 2
+        assert cache.get('c') is None
+        assert cache.num_bytes <= 3 * a.nbytes
+
+        # results larger than max_bytes aren't kept in memory
+        cache.set('g', {'h': numpy.zeros(4000)})
+        assert cache.get('g') is None
+        assert len(cache) == 2
+
+    def test_max_dir_bytes(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        value = {'a': numpy.zeros(1000)}
+        cache = ResultCache(cache_dir=cache_dir)
+        cache.set('a', value)
+        file_size = os.path.getsize(os.path.join(cache_dir, 'a.npz'))
+
+        cache = ResultCache(cache_dir=cache_dir,
+            max_dir_bytes=int(3.5 * file_size))
+        for i, key in enumerate(['b', 'c']):
+            cache.set(key, value)
+            os.utime(os.path.join(cache_dir, key + '.npz'), (i + 1, i + 1))
+        os.utime(os.path.join(cache_dir, 'a.npz'), (0, 0))
+        # loading marks 'a' as recently used, leaving 'b' least recently used
+        assert ResultCache(cache_dir=cache_dir).get('a') is not None
+        cache.set('d', value)
+        assert sorted(os.listdir(cache_dir)) == ['a.npz', 'c.npz', 'd.npz']
+
+    def test_stale_temp_files_removed(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        os.makedirs(cache_dir)
+        for name, age in (('.tmp-old', 2 * ResultCache.STALE_TEMP_FILE_AGE),
+                ('.tmp-new', 0)):
+            file_name = os.path.join(cache_dir, name)
+            open(file_name, 'w').close()
+            mtime = time.time() - age
+            os.utime(file_name, (mtime, mtime))
+        ResultCache(cache_dir=cache_dir)
+        assert os.listdir(cache_dir) == ['.tmp-new']
+
+    def test_disk(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        ResultCache(cache_dir=cache_dir).set('a', {'b': [1.0]})
+        assert os.listdir(cache_dir) == ['a.npz']
+        assert ResultCache(cache_dir=cache_dir).get('a') == {'b': [1.0]}
+        assert ResultCache(cache_dir=cache_dir).get('b') is None
+
+    def test_disk_arrays(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        ResultCache(cache_dir=cache_dir).set('a', ({
+            'b': numpy.array([1.0, 2.5]),
+            'c': {'d': [numpy.array([3.0]), 'e', 4.0, numpy.float64(5.0)]}
+        }, None))
+        value = ResultCache(cache_dir=cache_dir).get('a')
+        assert value[1] is None
+        assert_array_equal(value[0]['b'], [1.0, 2.5])
+        assert not value[0]['b'].flags.writeable
+        assert_array_equal(value[0]['c']['d'][0], [3.0])
+        assert value[0]['c']['d'][1:] == ['e', 4.0, 5.0]
+
+    def test_disk_pickles_not_loaded(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        os.makedirs(cache_dir)
+        with open(os.path.join(cache_dir, 'a.npz'), 'wb') as f:
+            numpy.savez(f, skeleton=numpy.array('{}'),
+                a0=numpy.array([{'b': 1}], dtype=object))
+        assert ResultCache(cache_dir=cache_dir).get('a') is None
+
+class TestEmissionsCalculatorResultCaching:
+
+    def test_hit_and_miss(self):
+        cache = CountingResultCache()
+        calculator = EmissionsCalculator(LOOK_UPS, result_cache=cache)
+        first = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        first_efs = calculator.emissions_factors
+        assert len(cache) == 1
+
+        # identical consumption, in a new dict, hits the cache
+        assert calculator.calculate(copy.deepcopy(CONSUME_OUTPUT)) == first
+        assert calculator.emissions_factors == first_efs
+        assert cache.hits == 1
+
+        # different consumption, or weights, miss
+        other = calculator.calculate(copy.deepcopy(OTHER_CONSUME_OUTPUT))
+        assert_results_are_approximately_equal(
+            EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(OTHER_CONSUME_OUTPUT)), other)
+        weighted = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT),
+            weights=[1.0, 1.0])
+        assert 'fire' in weighted
+        assert len(cache) == 3
+        assert cache.hits == 1
+
+    def test_results_not_shared(self):
+        calculator = EmissionsCalculator(LOOK_UPS, result_cache=ResultCache())
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        first = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        first['summary']['total']['total']['CO2'][0] = 999
+        second = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        second['summary']['total']['total']['CO2'][0] = 999
+        second['summary'].pop('ground fuels')
+        assert_results_are_approximately_equal(expected,
+            calculator.calculate(copy.deepcopy(CONSUME_OUTPUT)))
+
+    def test_results_not_shared_output_arrays(self):
+        calculator = EmissionsCalculator(LOOK_UPS, result_cache=ResultCache(),
+            output_arrays=True)
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        first = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        first['summary']['total']['total']['CO2'][0] = 999
+        second = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        with raises(ValueError):
+            second['summary']['total']['total']['CO2'][0] = 999
+        second['summary'].pop('ground fuels')
+        actual = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        assert_results_are_approximately_equal(expected,
+            list_values(actual))
+
+    def test_lookup_key(self):
+        cache = CountingResultCache()
+        EmissionsCalculator(LOOK_UPS, result_cache=cache,
+            lookup_key='rx').calculate(copy.deepcopy(CONSUME_OUTPUT))
+
+        # calculators without look-up keys don't share results
+        EmissionsCalculator(LOOK_UPS, result_cache=cache).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        assert cache.hits == 0
+
+        # calculators with same look-up key do, while those with different
+        # keys or species don't
+        EmissionsCalculator(LOOK_UPS, result_cache=cache,
+            lookup_key='rx').calculate(copy.deepcopy(CONSUME_OUTPUT))
+        assert cache.hits == 1
+        wf = EmissionsCalculator([LOOK_UP_WF_13, LOOK_UP_WF_130],
+            result_cache=cache, lookup_key='wf').calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        assert_results_are_approximately_equal(
+            EmissionsCalculator([LOOK_UP_WF_13, LOOK_UP_WF_130]).calculate(
+            copy.deepcopy(CONSUME_OUTPUT)), wf)
+        EmissionsCalculator(LOOK_UPS, result_cache=cache,
+            lookup_key='rx', species=['CO']).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        assert cache.hits == 1
+
+    def test_disk_across_calculators(self, tmp_path):
+        cache_dir = str(tmp_path / 'cache')
+        first = EmissionsCalculator(LOOK_UPS, lookup_key='rx',
+            result_cache=ResultCache(cache_dir=cache_dir)).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        cache = CountingResultCache(cache_dir=cache_dir)
+        calculator = EmissionsCalculator(LOOK_UPS, lookup_key='rx',
+            result_cache=cache)
+        cached = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        assert cache.hits == 1
+        assert cached == first
+        assert calculator.emissions_factors is not None
+
+    def test_disk_invalidated_by_eflookup_upgrade(self, tmp_path, monkeypatch):
+        cache_dir = str(tmp_path / 'cache')
+        EmissionsCalculator(LOOK_UPS, lookup_key='rx',
+            result_cache=ResultCache(cache_dir=cache_dir)).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        version = calculator._eflookup_version()
+        monkeypatch.setattr(calculator, '_eflookup_version',
+            lambda: '{}.1'.format(version))
+        cache = CountingResultCache(cache_dir=cache_dir)
+        EmissionsCalculator(LOOK_UPS, lookup_key='rx',
+            result_cache=cache).calculate(copy.deepcopy(CONSUME_OUTPUT))
+        assert cache.hits == 0
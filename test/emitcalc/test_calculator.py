@@ -286,6 +286,37 @@ class TestEmissionsCalculator:
         }
         assert_results_are_approximately_equal(expected, emissions)
 
+    def test_invalid_consumption_values(self):
+        for invalid in ([None, 1.0], ["1.5", 2.0], [True, 2], [float('nan'), 1.0]):
+            basal_accumulations = copy.deepcopy(BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT)
+            basal_accumulations['flaming'] = invalid
+            consume_output = {
+                "ground fuels": {
+                    "basal accumulations": basal_accumulations
+                }
+            }
+            with raises(ValueError) as e:
+                EmissionsCalculator([LOOK_UP_RX_13, LOOK_UP_RX_130]).calculate(
+                    copy.deepcopy(consume_output))
+            assert e.value.args[0] == EmissionsCalculator.ERROR_MESSAGES[
+                'INVALID_INPUT_DATA_VALUES'] % (
+                'ground fuels', 'basal accumulations', 'flaming')
+
+            calculator = EmissionsCalculator([LOOK_UP_RX_13, LOOK_UP_RX_130],
+                silent_fail=True)
+            emissions = calculator.calculate(consume_output)
+            # Flaming dict should have been skipped, so
+            expected = {
+                'ground fuels': {
+                    'basal accumulations': BASAL_ACCUMULATIONS_NO_FLAMING_RX_13_130_NORMAL_LOOKUP_EMISSIONS_EXPECTED
+                },
+                "summary": {
+                    "ground fuels": BASAL_ACCUMULATIONS_NO_FLAMING_RX_13_130_NORMAL_LOOKUP_EMISSIONS_EXPECTED,
+                    "total": TOTAL_BASAL_ACCUMULATIONS_NO_FLAMING_RX_13_130_NORMAL_LOOKUP_EMISSIONS_EXPECTED
+                }
+            }
+            assert_results_are_approximately_equal(expected, emissions)
+
     # TODO: test case where consume output dict is empty or not a dict
     # TODO: test case where category dict is empty or not a dict
     # TODO: test case where sub-category dict is empty or not a dict
@@ -449,3 +480,133 @@ class TestEmissionsCalculator:
         assert_results_are_approximately_equal(expected, emissions)
 
     # TODO: test case where summary sums float with None (and thus skips 'None')
+
+    # # Fuelbed weights
+
+    def test_invalid_number_of_weights(self):
+        consume_output = {
+            "ground fuels": {
+                "basal accumulations": copy.deepcopy(BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT),
+            }
+        }
+        with raises(ValueError) as e_info:
+            EmissionsCalculator([LOOK_UP_RX_13, LOOK_UP_RX_130]).calculate(
+                consume_output, weights=[1.0])
+
+    def test_invalid_weight_and_area_values(self):
+        consume_output = {
+            "ground fuels": {
+                "basal accumulations": BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT,
+            }
+        }
+        calculator = EmissionsCalculator([LOOK_UP_RX_13, LOOK_UP_RX_130])
+        for weights in ([float('nan'), 1.0], [float('inf'), 1.0], [-0.5, 1.0]):
+            with raises(ValueError) as e_info:
+                calculator.calculate(copy.deepcopy(consume_output),
+                    weights=weights)
+            assert e_info.value.args[0] == EmissionsCalculator.ERROR_MESSAGES[
+                'INVALID_WEIGHT_VALUES']
+        for area in (float('nan'), float('inf'), -100):
+            with raises(ValueError) as e_info:
+                calculator.calculate(copy.deepcopy(consume_output),
+                    weights=[0.5, 0.5], area=area)
+            assert e_info.value.args[0] == EmissionsCalculator.ERROR_MESSAGES[
+                'INVALID_AREA']
+            with raises(ValueError):
+                calculator.calculate(copy.deepcopy(consume_output), area=area)
+
+    def test_weighted_two_fuel_beds(self):
+        consume_output = {
+            "ground fuels": {
+                "basal accumulations": copy.deepcopy(BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT),
+            },
+            "litter-lichen-moss": {
+                "litter": copy.deepcopy(LITTER_RX_13_130_CONSUME_OUT),
+            }
+        }
+        calculator = EmissionsCalculator(
+            [LOOK_UP_DIFFERING_RX_13, LOOK_UP_DIFFERING_RX_130])
+        emissions = calculator.calculate(consume_output,
+            weights=[0.25, 0.75], area=100)
+
+        def _weighted(d):
+            return {
+                p: {s: [v[0] * 25, v[1] * 75] for s, v in list(p_dict.items())}
+                    for p, p_dict in list(d.items())
+            }
+        weighted_total = _weighted(TOTAL_BASAL_ACCUMULATIONS_PLUS_LITTER_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED)
+        expected = {
+            'ground fuels': {
+                'basal accumulations': _weighted(BASAL_ACCUMULATIONS_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED)
+            },
+            'litter-lichen-moss': {
+                'litter': _weighted(LITTER_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED)
+            },
+            "summary": {
+                "ground fuels": _weighted(BASAL_ACCUMULATIONS_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED),
+                "litter-lichen-moss": _weighted(LITTER_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED),
+                "total": weighted_total
+            }
+        }
+        fire = emissions.pop('fire')
+        assert_results_are_approximately_equal(expected, emissions)
+
+        # fire-level values are per-fuelbed values summed
+        assert set(fire.keys()) == {'ground fuels', 'litter-lichen-moss', 'total'}
+        for p, p_dict in list(weighted_total.items()):
+            for s, values in list(p_dict.items()):
+                assert_approx_equal(fire['total'][p][s], sum(values),
+                    significant=8)
+
+    def test_area_without_weights(self):
+        consume_output = {
+            "ground fuels": {
+                "basal accumulations": copy.deepcopy(BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT),
+            }
+        }
+        calculator = EmissionsCalculator(
+            [LOOK_UP_DIFFERING_RX_13, LOOK_UP_DIFFERING_RX_130])
+        emissions = calculator.calculate(copy.deepcopy(consume_output), area=100)
+        expected = calculator.calculate(copy.deepcopy(consume_output),
+            weights=[1.0, 1.0], area=100)
+        assert emissions.pop('fire') == expected.pop('fire')
+        assert_results_are_approximately_equal(expected, emissions)
+
+        unweighted = calculator.calculate(copy.deepcopy(consume_output))
+        co2 = unweighted['summary']['total']['total']['CO2']
+        assert_approx_equal(emissions['summary']['total']['total']['CO2'][0],
+            co2[0] * 100, significant=8)
+
+    # # EF caching
+
+    def test_efs_cached_across_calls(self):
+        class CountingLookup(BasicEFLookup):
+            num_gets = 0
+            def get(self, **keys):
+                CountingLookup.num_gets += 1
+                return super(CountingLookup, self).get(**keys)
+
+        calculator = EmissionsCalculator(CountingLookup({
+            'flaming': {'CO2': 143.23, 'CO': 14.0},
+            'smoldering': {'CO2': 143.23, 'CO': 14.0},
+            'residual': {'CO2': 4.55, 'CO': 140.0}
+        }))
+        consume_output = {
+            "ground fuels": {
+                "basal accumulations": BASAL_ACCUMULATIONS_RX_13_130_CONSUME_OUT,
+            }
+        }
+        first = calculator.calculate(copy.deepcopy(consume_output))
+        num_gets = CountingLookup.num_gets
+        assert num_gets > 0
+        second = calculator.calculate(copy.deepcopy(consume_output))
+        assert CountingLookup.num_gets == num_gets
+        assert_results_are_approximately_equal(first, second)
+
+        # differently structured data requires new look-ups
+        calculator.calculate({
+            "ground fuels": {
+                "basal accumulations": copy.deepcopy(BASAL_ACCUMULATIONS_RX_13_CONSUME_OUT),
+            }
+        })
+        assert CountingLookup.num_gets > num_gets
@@ -0,0 +1,98 @@
+__author__      = "Joel Dubowy"
+
+import copy
+import json
+
+import numpy
+from numpy.testing import assert_array_equal
+from pytest import fixture, raises, skip
+
+from emitcalc import codec
+from emitcalc.calculator import EmissionsCalculator
+
+import helpers
+from helpers import LOOK_UPS
+from test_calculator import assert_results_are_approximately_equal
+
+CONSUME_OUTPUT = dict(helpers.CONSUME_OUTPUT, debug={
+    "note": "not [1, 2] an array",
+    "nested": [[1, 2], [3]],
+    "empty": [],
+    "mixed": [1, "a"],
+    "booleans": [1, True],
+    "strings": ["1.0", "2.0"]
+})
+
+# Run every test both with orjson, if installed, and with the json module
+@fixture(autouse=True, params=['orjson', 'json'])
+def json_backend(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(codec, '_orjson', None)
+    elif codec._orjson is None:
+        skip("orjson not installed")
+    return request.param
+
+class TestLoads:
+
+    def test_arrays_decoded(self):
+        data = codec.loads(json.dumps(CONSUME_OUTPUT))
+        litter = data['litter-lichen-moss']['litter']
+        assert isinstance(litter['flaming'], numpy.ndarray)
+        assert litter['flaming'].dtype == numpy.float64
+        assert_array_equal(litter['flaming'], [1.3, 0.14])
+        assert data['debug']['note'] == "not [1, 2] an array"
+        assert [a.tolist() for a in data['debug']['nested']] == [[1.0, 2.0], [3.0]]
+        assert data['debug']['empty'] == []
+        assert data['debug']['mixed'] == [1, "a"]
+        assert data['debug']['booleans'] == [1, True]
+        assert type(data['debug']['booleans'][1]) is bool
+        assert data['debug']['strings'] == ["1.0", "2.0"]
+
+    def test_invalid(self):
+        with raises(ValueError):
+            codec.loads('{"a": [1,,2]}')
+
+    def test_non_finite_constants_rejected(self):
+        for constant in ('NaN', 'Infinity', '-Infinity'):
+            with raises(ValueError):
+                codec.loads('{"a": [%s, 1.0]}' % (constant))
+
+class TestDumps:
+
+    def test_numpy_values(self):
+        obj = {
+            'a': numpy.array([0.1, 188.60934999999998, 1e16, 1e-05, 0.0, -2.5]),
+            'b': {'c': [numpy.array([]), numpy.array([1, 2]), 'd']},
+            'e': numpy.float64(3.5),
+            # non-contiguous
+            'f': numpy.arange(6.0).reshape(2, 3)[:, 1]
+        }
+        expected = {
+            'a': [0.1, 188.60934999999998, 1e16, 1e-05, 0.0, -2.5],
+            'b': {'c': [[], [1, 2], 'd']},
+            'e': 3.5,
+            'f': [1.0, 4.0]
+        }
+        for indent in (None, 2, 4):
+            assert json.loads(codec.dumps(obj, indent=indent)) == expected
+
+    def test_not_serializable(self):
+        with raises(TypeError):
+            codec.dumps({'a': object()})
+
+    def test_round_trip(self):
+        a = numpy.random.default_rng(0).random(1000) * 1e3
+        assert_array_equal(codec.loads(codec.dumps({'a': a}))['a'], a)
+
+class TestCalculatorBoundary:
+
+    def test_arrays_in_and_out(self):
+        calculator = EmissionsCalculator(LOOK_UPS, output_arrays=True)
+        emissions = calculator.calculate(codec.loads(json.dumps(CONSUME_OUTPUT)))
+        assert isinstance(emissions['summary']['total']['total']['CO'],
+            numpy.ndarray)
+
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        assert_results_are_approximately_equal(expected,
+            json.loads(codec.dumps(emissions)))
@@ -0,0 +1,102 @@
+__author__      = "Joel Dubowy"
+
+import copy
+
+import numpy
+from numpy.testing import assert_allclose
+from pytest import raises
+
+from emitcalc.calculator import EmissionsCalculator
+from emitcalc.ensemble import EnsembleEmissionsCalculator
+
+from helpers import CONSUME_OUTPUT, LOOK_UPS
+from test_calculator import assert_results_are_approximately_equal
+
+class TestEnsembleEmissionsCalculator:
+
+    def test_num_members_required(self):
+        calculator = EnsembleEmissionsCalculator(LOOK_UPS)
+        with raises(ValueError):
+            calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+
+    def test_num_members_mismatch(self):
+        calculator = EnsembleEmissionsCalculator(LOOK_UPS)
+        with raises(ValueError):
+            calculator.calculate(copy.deepcopy(CONSUME_OUTPUT),
+                num_members=3, consumption_perturbation=numpy.ones(4))
+
+    def test_invalid_distribution(self):
+        calculator = EnsembleEmissionsCalculator(LOOK_UPS)
+        with raises(ValueError):
+            calculator.calculate(copy.deepcopy(CONSUME_OUTPUT), num_members=3,
+                consumption_perturbation={'distribution': 'foo'})
+        for perturbation in ({'distribution': 'normal'},
+                {'distribution': 'uniform', 'low': 0.8}):
+            with raises(ValueError):
+                calculator.calculate(copy.deepcopy(CONSUME_OUTPUT),
+                    num_members=3, ef_perturbation=perturbation)
+
+    def test_normal_truncated_at_zero(self):
+        calculator = EnsembleEmissionsCalculator(LOOK_UPS, seed=0)
+        factors = calculator._factors({'distribution': 'normal', 'sigma': 2.0},
+            0, 1000, (3,))
+        assert factors.shape == (1000, 3)
+        assert (factors >= 0.0).all()
+        # redrawn rather than clipped, so there's no mass at 0
+        assert (factors > 0.0).all()
+
+    def test_no_perturbation(self):
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))['summary']
+        stats = EnsembleEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT), num_members=5)
+        assert set(stats.keys()) == {'mean', 'variance', 'p5', 'p50', 'p95'}
+        for stat in ('mean', 'p5', 'p50', 'p95'):
+            # wrapped to match nesting expected by the helper
+            assert_results_are_approximately_equal({'summary': expected},
+                {'summary': stats[stat]})
+        for v in stats['variance']['total']['total'].values():
+            assert_allclose(v, 0.0, atol=1e-9)
+
+    def test_sample_arrays(self):
+        # members scale consumption by 1, 2, and 3, and EFs by 2
+        stats = EnsembleEmissionsCalculator(LOOK_UPS, percentiles=[50],
+            chunk_size=2).calculate(copy.deepcopy(CONSUME_OUTPUT),
+            consumption_perturbation=numpy.array([1.0, 2.0, 3.0]),
+            ef_perturbation=numpy.full((3, 1, 1, 1, 1), 2.0))
+        assert set(stats.keys()) == {'mean', 'variance', 'p50'}
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))['summary']
+        for c in expected:
+            for p in expected[c]:
+                for s in expected[c][p]:
+                    e = numpy.array(expected[c][p][s])
+                    assert_allclose(stats['mean'][c][p][s], 4.0 * e)
+                    assert_allclose(stats['p50'][c][p][s], 4.0 * e)
+                    assert_allclose(stats['variance'][c][p][s],
+                        numpy.var([2.0, 4.0, 6.0]) * e ** 2, atol=1e-9)
+
+    def test_per_fuelbed_sample_array(self):
+        # only the second fuelbed is perturbed
+        stats = EnsembleEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT),
+            consumption_perturbation=numpy.array([[1.0, 0.0], [1.0, 2.0]]))
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))['summary']
+        e = numpy.array(expected['total']['total']['CO'])
+        assert_allclose(stats['mean']['total']['total']['CO'],
+            [e[0], e[1]])
+        assert_allclose(stats['variance']['total']['total']['CO'],
+            [0.0, e[1] ** 2], atol=1e-9)
+
+    def test_distribution(self):
+        stats = EnsembleEmissionsCalculator(LOOK_UPS, seed=123).calculate(
+            copy.deepcopy(CONSUME_OUTPUT), num_members=2000,
+            ef_perturbation={'distribution': 'lognormal', 'sigma': 0.1})
+        expected = EmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))['summary']
+        assert_allclose(stats['p50']['total']['total']['CO'],
+            expected['total']['total']['CO'], rtol=0.02)
+        for v, e in zip(stats['p5']['total']['total']['CO'],
+                expected['total']['total']['CO']):
+            assert v <= e
@@ -0,0 +1,70 @@
+__author__      = "Joel Dubowy"
+
+import copy
+
+from pytest import raises
+
+from emitcalc.calculator import EmissionsCalculator
+from emitcalc.scenarios import ScenarioEmissionsCalculator
+
+import helpers
+from test_calculator import (
+    LOOK_UP_RX_13, LOOK_UP_RX_130, LOOK_UP_WF_13, LOOK_UP_WF_130,
+    assert_results_are_approximately_equal
+)
+
+CONSUME_OUTPUT = dict(helpers.CONSUME_OUTPUT, debug={  # <-- ignored
+    "foo": "bar"
+})
+
+SCENARIOS = {
+    'rx': [LOOK_UP_RX_13, LOOK_UP_RX_130],
+    'wf': [LOOK_UP_WF_13, LOOK_UP_WF_130],
+    'differing': helpers.LOOK_UPS
+}
+
+class TestScenarioEmissionsCalculator:
+
+    def test_no_scenarios(self):
+        with raises(ValueError):
+            ScenarioEmissionsCalculator({})
+
+    def test_mismatched_number_of_lookups(self):
+        with raises(ValueError):
+            ScenarioEmissionsCalculator({
+                'a': [LOOK_UP_RX_13, LOOK_UP_RX_130],
+                'b': [LOOK_UP_WF_13]
+            })
+
+    def test_matches_individual_calculations(self):
+        calculator = ScenarioEmissionsCalculator(SCENARIOS)
+        emissions = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        assert set(emissions.keys()) == set(SCENARIOS.keys())
+        for name, lookups in list(SCENARIOS.items()):
+            c = EmissionsCalculator(lookups)
+            expected = c.calculate(copy.deepcopy(CONSUME_OUTPUT))
+            assert_results_are_approximately_equal(expected, emissions[name])
+            assert_results_are_approximately_equal(c.emissions_factors,
+                calculator.emissions_factors[name])
+
+    def test_species_whitelist(self):
+        calculator = ScenarioEmissionsCalculator(SCENARIOS,
+            species=['CO', 'PM2.5', 'FDF'])
+        emissions = calculator.calculate(copy.deepcopy(CONSUME_OUTPUT))
+        for name, lookups in list(SCENARIOS.items()):
+            expected = EmissionsCalculator(lookups,
+                species=['CO', 'PM2.5', 'FDF']).calculate(
+                copy.deepcopy(CONSUME_OUTPUT))
+            assert_results_are_approximately_equal(expected, emissions[name])
+
+    def test_single_and_per_fuelbed_lookups(self):
+        scenarios = {
+            'single': LOOK_UP_WF_13,
+            'per-fuelbed': [LOOK_UP_RX_13, LOOK_UP_RX_130]
+        }
+        emissions = ScenarioEmissionsCalculator(scenarios).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        for name, lookups in list(scenarios.items()):
+            expected = EmissionsCalculator(lookups).calculate(
+                copy.deepcopy(CONSUME_OUTPUT))
+            assert_results_are_approximately_equal(expected, emissions[name])
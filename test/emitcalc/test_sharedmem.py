@@ -0,0 +1,100 @@
+__author__      = "Joel Dubowy"
+
+import copy
+import gc
+import multiprocessing
+import pickle
+import weakref
+
+import numpy
+from pytest import mark, raises
+
+from emitcalc.calculator import EmissionsCalculator
+from emitcalc.sharedmem import SharedMemoryEmissionsCalculator
+
+from helpers import CONSUME_OUTPUT, LOOK_UPS, list_values
+from test_calculator import assert_results_are_approximately_equal
+
+def _consume(shared):
+    """Runs in a separate process"""
+    with shared:
+        emissions = shared.to_dict()
+        total_co = emissions['summary']['total']['total']['CO'].tolist()
+        # written in place, to be seen by the parent
+        shared.emissions[...] *= 2
+    return total_co
+
+class TestSharedMemoryEmissionsCalculator:
+
+    def test_matches_calculator(self):
+        expected_calculator = EmissionsCalculator(LOOK_UPS)
+        expected = expected_calculator.calculate(copy.deepcopy(CONSUME_OUTPUT),
+            weights=[0.5, 2.0])
+        shared = SharedMemoryEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT), weights=[0.5, 2.0])
+        try:
+            actual = shared.to_dict()
+            fire = actual.pop('fire')
+            expected_fire = expected.pop('fire')
+            assert_results_are_approximately_equal(expected,
+                list_values(actual))
+            assert_results_are_approximately_equal(
+                expected_calculator.emissions_factors,
+                list_values(shared.emissions_factors_dict()))
+            for p, p_dict in expected_fire['total'].items():
+                for s, v in p_dict.items():
+                    numpy.testing.assert_approx_equal(fire['total'][p][s], v)
+        finally:
+            shared.unlink()
+
+    def test_descriptor_is_small(self):
+        shared = SharedMemoryEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        try:
+            assert len(pickle.dumps(shared)) < 2048
+            unpickled = pickle.loads(pickle.dumps(shared))
+            with raises(RuntimeError):
+                unpickled.emissions
+        finally:
+            shared.unlink()
+
+    def test_other_process(self):
+        shared = SharedMemoryEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        try:
+            expected_emissions = shared.emissions.copy()
+            expected_co = shared.to_dict()['summary']['total']['total']['CO']
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                total_co = pool.apply(_consume, (shared,))
+            numpy.testing.assert_allclose(total_co, expected_co)
+            numpy.testing.assert_allclose(shared.emissions,
+                2 * expected_emissions)
+        finally:
+            shared.unlink()
+
+    # closing the block while arrays are referenced must neither fail nor be
+    # deferred to an exception in SharedMemory.__del__
+    @mark.filterwarnings('error::pytest.PytestUnraisableExceptionWarning')
+    def test_arrays_valid_after_detach(self):
+        shared = SharedMemoryEmissionsCalculator(LOOK_UPS).calculate(
+            copy.deepcopy(CONSUME_OUTPUT))
+        try:
+            emissions = shared.emissions
+            total_co = shared.to_dict()['summary']['total']['total']['CO']
+            expected_emissions = emissions.copy()
+            expected_co = total_co.copy()
+            shm = weakref.ref(shared._shm)
+            shared.detach()
+
+            # the arrays keep the block mapped
+            gc.collect()
+            assert shm() is not None
+            numpy.testing.assert_array_equal(emissions, expected_emissions)
+            numpy.testing.assert_array_equal(total_co, expected_co)
+
+            # and it's closed once they're dropped
+            del emissions, total_co
+            gc.collect()
+            assert shm() is None
+        finally:
+            shared.unlink()
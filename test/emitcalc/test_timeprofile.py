@@ -0,0 +1,78 @@
+__author__      = "Joel Dubowy"
+
+import copy
+
+from numpy.testing import assert_allclose
+from pytest import raises
+
+from emitcalc.calculator import EmissionsCalculator
+from emitcalc.timeprofile import HourlyProfiler
+
+from helpers import CONSUME_OUTPUT, LOOK_UPS
+from test_calculator import (
+    TOTAL_BASAL_ACCUMULATIONS_PLUS_LITTER_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED
+)
+
+EXPECTED = TOTAL_BASAL_ACCUMULATIONS_PLUS_LITTER_RX_13_130_DIFFERING_LOOKUP_EMISSIONS_EXPECTED
+
+def _emissions():
+    return EmissionsCalculator(LOOK_UPS).calculate(
+        copy.deepcopy(CONSUME_OUTPUT))
+
+HOURLY_FRACTIONS = {
+    'flaming': [0.5, 0.5, 0.0],
+    'smoldering': [0.0, 0.25, 0.75],
+    'residual': [0.0, 0.0, 1.0]
+}
+
+class TestHourlyProfiler:
+
+    def test_missing_phase(self):
+        with raises(ValueError):
+            HourlyProfiler({'flaming': [1.0], 'smoldering': [1.0]})
+
+    def test_mismatched_number_of_hours(self):
+        with raises(ValueError):
+            HourlyProfiler({'flaming': [1.0], 'smoldering': [1.0],
+                'residual': [0.5, 0.5]})
+
+    def test_mismatched_number_of_fuelbeds(self):
+        profiler = HourlyProfiler({'flaming': [[1.0]] * 3,
+            'smoldering': [1.0], 'residual': [1.0]})
+        with raises(ValueError):
+            profiler.profile(_emissions())
+
+    def test_summed_across_fuelbeds(self):
+        hourly = HourlyProfiler(HOURLY_FRACTIONS).profile(_emissions())
+        assert hourly.values.shape == (3, len(hourly.species))
+        j = hourly.species.index('CO2')
+        flaming = sum(EXPECTED['flaming']['CO2'])
+        smoldering = sum(EXPECTED['smoldering']['CO2'])
+        residual = sum(EXPECTED['residual']['CO2'])
+        assert_allclose(hourly.values[:, j], [
+            0.5 * flaming,
+            0.5 * flaming + 0.25 * smoldering,
+            0.75 * smoldering + residual
+        ])
+        # all emissions are allocated
+        assert_allclose(hourly.values.sum(axis=0),
+            [sum(EXPECTED['total'][s]) for s in hourly.species])
+
+    def test_per_fuelbed(self):
+        fractions = dict(HOURLY_FRACTIONS,
+            flaming=[[1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+        hourly = HourlyProfiler(fractions).profile(_emissions(),
+            per_fuelbed=True)
+        assert hourly.values.shape == (3, len(hourly.species), 2)
+        j = hourly.species.index('CO')
+        assert_allclose(hourly.values[:, j, 1], [
+            0.0,
+            0.25 * EXPECTED['smoldering']['CO'][1],
+            EXPECTED['flaming']['CO'][1] + 0.75 * EXPECTED['smoldering']['CO'][1]
+        ])
+
+    def test_single_profile_for_all_phases(self):
+        hourly = HourlyProfiler([0.25, 0.75]).profile(_emissions(),
+            category='ground fuels')
+        j = hourly.species.index('NM')
+        assert_allclose(hourly.values[:, j], [11.5, 34.5])